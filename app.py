@@ -1,24 +1,132 @@
 from flask import Flask, render_template, request, send_file, jsonify
+import glob
+import logging
+import multiprocessing
 import os
+import threading
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from excel_processor import ExcelProcessor
+from disk_cache import DiskLRUCache
+from chart_index import chart_index_path, load_chart_index
+from chart_renderer import RENDER_PROFILES, chart_cache_key, render_chart, render_settings
+from job_queue import JobQueue
+from metrics import CHARTS, REGISTRY
+from schema import SchemaResolver
+from upload_spool import SpoolingRequest
 import json
 
 app = Flask(__name__)
+app.request_class = SpoolingRequest  # Ghi file upload thẳng xuống đĩa theo từng chunk
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024  # Tổng dung lượng upload tối đa mỗi request (512MB)
+app.config['INGEST_WORKERS'] = os.cpu_count() or 1  # Số process đọc file song song
+app.config['CHART_WORKERS'] = os.cpu_count() or 1  # Số process vẽ biểu đồ song song
+app.config['CHART_CACHE_FOLDER'] = os.path.join('cache', 'charts')
+app.config['CHART_CACHE_MAX_BYTES'] = 512 * 1024 * 1024  # 512MB ảnh biểu đồ
+app.config['EXTRACT_CACHE_FOLDER'] = os.path.join('cache', 'extracted')
+app.config['EXTRACT_CACHE_MAX_BYTES'] = 1024 * 1024 * 1024  # 1GB dữ liệu đã trích xuất
+app.config['CHART_PROFILE'] = 'screen'  # Hồ sơ độ phân giải mặc định: draft / screen / print
+app.config['CHART_HTTP_MAX_AGE'] = 24 * 3600  # Thời gian trình duyệt giữ ảnh biểu đồ (giây)
+app.config['RESULTS_PER_PAGE'] = 50  # Số SKU mặc định mỗi trang của API kết quả
+app.config['RESULTS_MAX_PER_PAGE'] = 500
+app.config['CHART_MODE'] = 'image'  # 'image' (ảnh matplotlib) hoặc 'native' (biểu đồ Excel gốc)
+app.config['WRITER_MODE'] = 'standard'  # 'standard' hoặc 'streaming' (bộ nhớ cố định khi có hàng nghìn SKU)
+app.config['SCHEMA_OVERRIDES_FILE'] = 'schema_overrides.json'  # Tùy chọn: chỉ định tên cột cho từng vai trò
+app.config['JOB_DATABASE'] = 'jobs.sqlite3'  # Bảng trạng thái job xử lý nền
+# Số job được xử lý đồng thời, các job khác xếp hàng chờ. Giới hạn tính theo từng
+# process: chạy N worker (vd gunicorn -w N) thì tối đa N * MAX_CONCURRENT_JOBS job
+app.config['MAX_CONCURRENT_JOBS'] = 2
+# Nạp sẵn pandas/openpyxl/matplotlib khi khởi động (vd. `gunicorn --preload` để nạp
+# một lần trong process master); mặc định chỉ nạp khi job đầu tiên chạy
+app.config['PRELOAD_HEAVY_IMPORTS'] = os.environ.get('PRELOAD_HEAVY_IMPORTS') == '1'
+# Mức log: DEBUG in cả thông tin từng sheet/biểu đồ, WARNING chỉ giữ cảnh báo và lỗi
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
 
-# Tạo thư mục nếu chưa có
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
-os.makedirs('static/charts', exist_ok=True)
+# Process con của ProcessPoolExecutor (start method spawn: Windows, macOS) import lại
+# module chính: chỉ process chính mới cấu hình log, tạo thư mục/cache và hàng đợi job
+# (hàng đợi đánh dấu lỗi các job dở dang của process đã dừng khi khởi tạo)
+IS_MAIN_PROCESS = multiprocessing.parent_process() is None
+
+if IS_MAIN_PROCESS:
+    logging.basicConfig(level=app.config['LOG_LEVEL'], format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    # Tạo thư mục nếu chưa có
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+    os.makedirs('static/charts', exist_ok=True)
+
+    # Cache ảnh biểu đồ dùng chung cho mọi request
+    chart_cache = DiskLRUCache(
+        app.config['CHART_CACHE_FOLDER'],
+        max_bytes=app.config['CHART_CACHE_MAX_BYTES'],
+        suffix='.png'
+    )
+
+    # Nhận diện cột dùng chung cho mọi job (cache theo bộ header)
+    if os.path.exists(app.config['SCHEMA_OVERRIDES_FILE']):
+        schema = SchemaResolver.from_file(app.config['SCHEMA_OVERRIDES_FILE'])
+    else:
+        schema = SchemaResolver()
+
+    # Hàng đợi job xử lý file chạy nền
+    job_queue = JobQueue(app.config['JOB_DATABASE'], max_concurrent=app.config['MAX_CONCURRENT_JOBS'])
+
+    # Cache kết quả parse/trích xuất theo hash nội dung file upload
+    extract_cache = DiskLRUCache(
+        app.config['EXTRACT_CACHE_FOLDER'],
+        max_bytes=app.config['EXTRACT_CACHE_MAX_BYTES'],
+        suffix='.pkl'
+    )
+
+# Vẽ biểu đồ theo yêu cầu từ trang xem biểu đồ
+chart_render_lock = threading.Lock()
 
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+CHART_MODES = {'image', 'native'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def preload_heavy_imports():
+    """Nạp trước các thư viện xử lý file (pandas, openpyxl, matplotlib, PIL)"""
+    import excel_processor  # noqa: F401
+    import chart_renderer
+    chart_renderer.preload()
+
+def run_report_job(progress, uploaded_files, options, previous_output=None):
+    """Job nền: xử lý các file đã upload và tạo file Excel output
+
+    previous_output: báo cáo lần trước, chỉ tạo lại các SKU có dữ liệu thay đổi
+    """
+    # Import khi cần: khởi động app (và các route /, /download...) không phải nạp pandas
+    from excel_processor import ExcelProcessor
+    
+    processor = ExcelProcessor(uploaded_files, progress_callback=progress, **options)
+    result = processor.process()
+    
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    
+    # Tạo file Excel output (có biểu đồ bên trong)
+    # Job id trong tên file: các job bắt đầu cùng một giây không ghi đè báo cáo của nhau
+    output_file = processor.create_output_excel(
+        result['data'], previous_output=previous_output, report_id=progress.job_id[:8]
+    )
+    if not output_file:
+        raise RuntimeError('Không tạo được file Excel output')
+    
+    # Danh sách SKU (kèm chỉ số) được lấy theo trang qua /runs/<run>/skus
+    return {
+        'message': f'Đã xử lý thành công {len(result["skus"])} mã SKU',
+        'sku_count': len(result['skus']),
+        'run': os.path.splitext(output_file)[0],
+        'output_file': output_file,
+        'chart_stats': processor.chart_stats,
+        'incremental_stats': processor.incremental_stats,
+        'stage_seconds': processor.stage_timer.seconds
+    }
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -34,37 +142,69 @@ def upload_files():
         if not files or files[0].filename == '':
             return jsonify({'error': 'Không có file nào được chọn'}), 400
         
-        uploaded_files = []
-        for file in files:
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                uploaded_files.append(filepath)
-        
-        if not uploaded_files:
+        # Kiểm tra tham số trước khi giữ lại file: file chưa finalize bị xóa khi
+        # request kết thúc nên lỗi 400 không để lại file rác trong thư mục upload
+        valid_files = [file for file in files if file and allowed_file(file.filename)]
+        if not valid_files:
             return jsonify({'error': 'Không có file Excel hợp lệ'}), 400
         
-        # Xử lý file Excel
-        processor = ExcelProcessor(uploaded_files)
-        result = processor.process()
+        chart_profile = request.form.get('chart_profile', app.config['CHART_PROFILE'])
+        if chart_profile not in RENDER_PROFILES:
+            return jsonify({'error': f'Hồ sơ biểu đồ không hợp lệ: {chart_profile}'}), 400
+        
+        chart_mode = request.form.get('chart_mode', app.config['CHART_MODE'])
+        if chart_mode not in CHART_MODES:
+            return jsonify({'error': f'Kiểu biểu đồ không hợp lệ: {chart_mode}'}), 400
         
-        if 'error' in result:
-            return jsonify(result), 400
+        # Cập nhật tăng dần từ một báo cáo trước (nếu được chọn)
+        previous_output = None
+        previous_name = secure_filename(request.form.get('previous_output', ''))
+        if previous_name:
+            previous_output = os.path.join(app.config['OUTPUT_FOLDER'], previous_name)
+            if not os.path.exists(previous_output):
+                return jsonify({'error': f'Không tìm thấy báo cáo trước: {previous_name}'}), 400
         
-        # Tạo file Excel output (có biểu đồ bên trong)
-        output_file = processor.create_output_excel(result['data'])
+        uploaded_files = []
+        file_hashes = {}
+        for file in valid_files:
+            # File đã được ghi xuống đĩa (và hash) trong lúc nhận request, chỉ cần đổi tên
+            file_path = file.stream.finalize(secure_filename(file.filename))
+            uploaded_files.append(file_path)
+            file_hashes[file_path] = file.stream.sha256
+        
+        # Xử lý file Excel ở job nền, trả về job id ngay
+        job_id = job_queue.submit(run_report_job, uploaded_files, {
+            'max_workers': app.config['INGEST_WORKERS'],
+            'chart_workers': app.config['CHART_WORKERS'],
+            'chart_cache': chart_cache,
+            'extract_cache': extract_cache,
+            'schema': schema,
+            'file_hashes': file_hashes,
+            'chart_profile': chart_profile,
+            'chart_mode': chart_mode,
+            'writer_mode': app.config['WRITER_MODE']
+        }, previous_output)
         
         return jsonify({
             'success': True,
-            'message': f'Đã xử lý thành công {len(result["skus"])} mã SKU',
-            'skus': result['skus'],
-            'output_file': output_file
-        })
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}'
+        }), 202
+    
+    except RequestEntityTooLarge:
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return jsonify({'error': f'Dung lượng upload vượt quá giới hạn {limit_mb}MB'}), 413
     
     except Exception as e:
         return jsonify({'error': f'Lỗi xử lý: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    return jsonify(job)
+
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
@@ -73,9 +213,154 @@ def download_file(filename):
     except Exception as e:
         return jsonify({'error': f'Lỗi tải file: {str(e)}'}), 404
 
+def _latest_run():
+    """Báo cáo mới nhất có spec biểu đồ (tên file output không có .xlsx)"""
+    runs = glob.glob(chart_index_path(os.path.join(app.config['OUTPUT_FOLDER'], '*.xlsx')))
+    if not runs:
+        return None
+    latest = max(runs, key=os.path.getmtime)
+    return os.path.basename(latest)[:-len('.charts.json')]
+
 @app.route('/view_charts/<sku>')
 def view_charts(sku):
-    return render_template('charts.html', sku=sku)
+    run = secure_filename(request.args.get('run', '')) or _latest_run()
+    charts = {}
+    if run:
+        charts = (load_chart_index(os.path.join(app.config['OUTPUT_FOLDER'], run + '.xlsx')) or {}).get(sku, {})
+    
+    # {năm: [loại biểu đồ]} - ảnh được vẽ khi trình duyệt tải lần đầu
+    years = {year: sorted(charts[year], key=lambda kind: kind != 'revenue') for year in sorted(charts)}
+    return render_template('charts.html', sku=sku, run=run, years=years)
+
+@app.route('/charts/<run>/<sku>/<year>.png')
+def chart_image(run, sku, year):
+    """Ảnh biểu đồ của một SKU/năm trong báo cáo `run` (?kind=revenue|tacos)
+
+    Biểu đồ được vẽ từ spec đã lưu khi được yêu cầu lần đầu rồi giữ trong cache
+    ảnh. ETag là hash của spec nên trình duyệt gửi lại If-None-Match sẽ nhận
+    304 mà không cần đọc hay vẽ ảnh.
+    """
+    kind = request.args.get('kind', 'revenue')
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(run) + '.xlsx')
+    charts = load_chart_index(output_path) or {}
+    entry = charts.get(sku, {}).get(year, {}).get(kind)
+    if entry is None:
+        return jsonify({'error': 'Không tìm thấy biểu đồ'}), 404
+    
+    # Vẽ lại theo hồ sơ độ phân giải của lần chạy, không phải hồ sơ mặc định của server
+    spec = dict(entry['spec'], **render_settings(entry['profile'], entry['spec']['figsize'], entry['width']))
+    key = chart_cache_key(spec)
+    
+    if key in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        png = chart_cache.get(key)
+        if png is None:
+            # style.context của matplotlib thay đổi rcParams toàn cục: vẽ lần lượt
+            with chart_render_lock:
+                png = render_chart(spec)
+            chart_cache.set(key, png)
+            CHARTS.inc(mode='web', source='rendered')
+        else:
+            CHARTS.inc(mode='web', source='cache')
+        response = app.response_class(png, mimetype='image/png')
+    
+    response.set_etag(key)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['CHART_HTTP_MAX_AGE']
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Chỉ số xử lý của process (file, dòng, SKU, biểu đồ, byte ghi, thời gian từng giai đoạn)
+
+    Định dạng text của Prometheus; các bộ đếm được tính từ lúc server khởi động.
+    """
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def _run_results(run):
+    # Import khi cần như ExcelProcessor (result_store nạp pandas)
+    from result_store import load_results
+    return load_results(os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(run) + '.xlsx'))
+
+def _int_arg(name, default, minimum, maximum=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} phải là số nguyên')
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValueError(f'{name} phải trong khoảng {minimum}-{maximum}' if maximum else f'{name} phải >= {minimum}')
+    return value
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} phải là số')
+
+@app.route('/runs/<run>/results')
+def run_summary(run):
+    """Tổng quan kết quả của báo cáo `run`: số SKU, các năm, tổng chỉ số theo năm"""
+    results = _run_results(run)
+    if results is None:
+        return jsonify({'error': 'Không tìm thấy kết quả xử lý'}), 404
+    return jsonify(dict(results.summary(), run=run))
+
+@app.route('/runs/<run>/skus')
+def run_skus(run):
+    """Danh sách SKU theo trang của báo cáo `run`
+
+    Tham số: year (mặc định năm mới nhất), sort (sku, product_name, quantity,
+    revenue, ad_spent, tacos, category), order (asc/desc), page, per_page,
+    category (lặp lại được), min_/max_<revenue|ad_spent|tacos|quantity>, q
+    (tìm theo mã SKU hoặc tên sản phẩm).
+    """
+    from result_store import NUMERIC_FIELDS
+    
+    results = _run_results(run)
+    if results is None:
+        return jsonify({'error': 'Không tìm thấy kết quả xử lý'}), 404
+    
+    try:
+        order = request.args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f'Thứ tự sắp xếp không hợp lệ: {order}')
+        
+        page = results.query(
+            year=request.args.get('year') or None,
+            sort=request.args.get('sort', 'revenue'),
+            descending=order == 'desc',
+            page=_int_arg('page', 1, 1),
+            per_page=_int_arg('per_page', app.config['RESULTS_PER_PAGE'], 1, app.config['RESULTS_MAX_PER_PAGE']),
+            categories=request.args.getlist('category'),
+            ranges={field: (_float_arg(f'min_{field}'), _float_arg(f'max_{field}')) for field in NUMERIC_FIELDS},
+            search=request.args.get('q', '').strip()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(dict(page, run=run))
+
+@app.route('/runs/<run>/skus/<sku>')
+def run_sku(run, sku):
+    """Chỉ số của một SKU theo từng năm trong báo cáo `run`"""
+    results = _run_results(run)
+    if results is None:
+        return jsonify({'error': 'Không tìm thấy kết quả xử lý'}), 404
+    
+    years = results.sku(sku)
+    if years is None:
+        return jsonify({'error': 'Không tìm thấy SKU'}), 404
+    return jsonify({'run': run, 'sku': sku, 'years': years})
+
+if IS_MAIN_PROCESS and app.config['PRELOAD_HEAVY_IMPORTS']:
+    preload_heavy_imports()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
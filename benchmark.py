@@ -0,0 +1,407 @@
+"""Đo hiệu năng ExcelProcessor trên workbook tổng hợp (synthetic) ở nhiều quy mô
+
+Ví dụ:
+    python benchmark.py --skus 100 500 2000 --weeks 52
+    python benchmark.py --skus 500 --chart-mode native --json bench.json
+    python benchmark.py --skus 500 --baseline bench.json --tolerance 0.2
+    python benchmark.py --startup --import-budget 0.5
+
+Mỗi lần chạy báo cáo thời gian, bộ nhớ (peak RSS) và kích thước file theo từng
+giai đoạn: parse (đọc sheet + khớp SKU, qua process pool và cache trích xuất
+như khi chạy thật), merge (dựng bảng dữ liệu SKU), aggregate (chỉ số TỔNG
+PERFORMANCE), write (sheet SKU), chart, format (định dạng + lưu file). Với
+--baseline, script trả về mã lỗi 1 nếu có giai đoạn chậm hơn kết quả đã lưu
+quá ngưỡng cho phép.
+
+--startup đo thời gian import app trong process Python mới (chi phí khởi động
+mỗi worker) và báo lỗi nếu vượt --import-budget hoặc nếu app nạp các thư viện
+nặng ngay khi import.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from chart_renderer import RENDER_PROFILES, DEFAULT_RENDER_PROFILE
+from disk_cache import DiskLRUCache
+from excel_processor import ExcelProcessor
+
+STAGES = ['parse', 'merge', 'aggregate', 'write', 'chart', 'format']
+
+# Giai đoạn báo qua progress_callback của ExcelProcessor -> giai đoạn benchmark
+_PROGRESS_STAGES = {
+    'parsing': 'parse',
+    'merging': 'merge',
+    'aggregating': 'aggregate',
+    'sku_sheets': 'write',
+    'charts': 'chart',
+    'formatting': 'format',
+}
+
+# Thư viện nặng chỉ được nạp khi job đầu tiên chạy (xem app.preload_heavy_imports)
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'matplotlib', 'PIL']
+
+_STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+_YEAR_HEADER = [None, None, 'ASIN', 'Số lượng bán ra', 'Tổng doanh số', 'Chi phí quảng cáo', 'Tacos']
+
+
+def _ordinal(n):
+    """1 -> '1st', 2 -> '2nd', 11 -> '11th', 22 -> '22nd'..."""
+    suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n if n < 20 else n % 10, 'th')
+    return f'{n}{suffix}'
+
+
+def generate_workbook(path, n_skus, weeks=52, years=('2024', '2025'), seed=0, sku_offset=0):
+    """Tạo workbook giống file thực tế: sheet TỔNG PERFORMANCE + một sheet cho mỗi năm
+
+    Sheet năm có 2 cột thời gian không tên (tháng, tuần -> Unnamed: 0/1), mỗi
+    SKU có `weeks` dòng. Khoảng 10% SKU vắng mặt trong mỗi năm và khoảng 20%
+    dòng thiếu số tuần ("Oct - nan") để đi qua cả nhánh đánh số tự động.
+    """
+    rng = np.random.default_rng(seed)
+    skus = [f'B0{sku_offset + i:08d}' for i in range(n_skus)]
+
+    workbook = openpyxl.Workbook(write_only=True)
+    performance = workbook.create_sheet('TỔNG PERFORMANCE')
+    performance.append(['STT', 'ASIN', 'Sản phẩm'])
+    for i, sku in enumerate(skus, 1):
+        performance.append([i, sku, f'Synthetic product {sku}'])
+
+    months = [_MONTHS[(week * 12) // max(weeks, 1) % 12] for week in range(weeks)]
+    week_numbers = []
+    for week, month in enumerate(months):
+        week_numbers.append(1 if week == 0 or months[week - 1] != month else week_numbers[-1] + 1)
+
+    for year in years:
+        sheet = workbook.create_sheet(str(year))
+        sheet.append(_YEAR_HEADER)
+
+        present = rng.random(n_skus) >= 0.1
+        quantity = rng.integers(0, 300, size=(n_skus, weeks))
+        revenue = np.round(rng.uniform(0, 5000, size=(n_skus, weeks)), 2)
+        ad_cost = np.round(rng.uniform(0, 1500, size=(n_skus, weeks)), 2)
+        missing_week = rng.random((n_skus, weeks)) < 0.2
+
+        for i, sku in enumerate(skus):
+            if not present[i]:
+                continue
+            for week in range(weeks):
+                rev = float(revenue[i, week])
+                ad = float(ad_cost[i, week])
+                sheet.append([
+                    months[week],
+                    None if missing_week[i, week] else _ordinal(week_numbers[week]),
+                    sku,
+                    int(quantity[i, week]),
+                    rev,
+                    ad,
+                    f'{ad / rev * 100:.2f}%' if rev else '0%'
+                ])
+
+    workbook.save(path)
+    return path
+
+
+def _peak_rss_mb(children=False):
+    """Peak RSS (MB) từ đầu tiến trình (hoặc của các process con); None nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux báo KB, macOS báo byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageMeter:
+    """Ghi thời gian và bộ nhớ của từng giai đoạn (giai đoạn mới kết thúc giai đoạn trước)
+
+    Peak RSS là mức cao nhất của tiến trình tính tới cuối giai đoạn (RSS chỉ
+    tăng), peak của process con (chart/parse song song) được ghi riêng. Với
+    trace_memory, tracemalloc đo thêm peak bộ nhớ Python cấp phát trong từng
+    giai đoạn (chậm hơn đáng kể).
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+        self._stage = None
+        self._started = None
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def start(self, stage):
+        if stage == self._stage:
+            return
+        self.stop()
+        self._stage = stage
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self._stage is None:
+            return
+        result = self.results.setdefault(self._stage, {'seconds': 0.0})
+        result['seconds'] += time.perf_counter() - self._started
+        result['peak_rss_mb'] = _peak_rss_mb()
+        result['children_rss_mb'] = _peak_rss_mb(children=True)
+        if self.trace_memory:
+            traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            result['traced_peak_mb'] = max(result.get('traced_peak_mb', 0.0), traced)
+        self._stage = None
+
+    def progress_callback(self, stage, done=None, total=None):
+        """Dùng làm progress_callback của ExcelProcessor"""
+        if stage in _PROGRESS_STAGES:
+            self.start(_PROGRESS_STAGES[stage])
+
+
+def run_benchmark(file_paths, workdir, trace_memory=False, **processor_options):
+    """Chạy ExcelProcessor.process() -> create_output_excel, trả về kết quả theo giai đoạn
+
+    Các giai đoạn được lấy từ progress_callback của ExcelProcessor nên đo đúng
+    đường chạy thật (process pool max_workers, extract_cache nếu có).
+    """
+    meter = StageMeter(trace_memory)
+    processor = ExcelProcessor(file_paths, progress_callback=meter.progress_callback, **processor_options)
+
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(workdir, 'outputs'), exist_ok=True)
+    os.chdir(workdir)
+    try:
+        with meter:
+            # Hash file để tra extract_cache chạy trước lần báo 'parsing' đầu tiên
+            meter.start('parse')
+            result = processor.process()
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            store = result['data']
+
+            meter.start('aggregate')
+            output_filename = processor.create_output_excel(store)
+    finally:
+        os.chdir(cwd)
+
+    if output_filename is None:
+        raise RuntimeError('create_output_excel không tạo được file output')
+
+    output_path = os.path.join(workdir, 'outputs', output_filename)
+    results = meter.results
+    results['parse']['size_mb'] = sum(os.path.getsize(path) for path in file_paths) / (1024 * 1024)
+    results['format']['size_mb'] = os.path.getsize(output_path) / (1024 * 1024)
+
+    return {
+        'skus': len(store.skus),
+        'rows': len(store.table),
+        'periods': store.periods,
+        'stages': {stage: results[stage] for stage in STAGES if stage in results},
+        'total_seconds': sum(result['seconds'] for result in results.values())
+    }
+
+
+def measure_startup(module='app', runs=5):
+    """Thời gian import module trong process Python mới (trung vị của `runs` lần)
+
+    Chạy trong thư mục tạm (app tạo thư mục uploads/outputs/cache khi import)
+    và bỏ PRELOAD_HEAVY_IMPORTS khỏi môi trường để đo đúng khởi động mặc định.
+    """
+    env = dict(os.environ)
+    env.pop('PRELOAD_HEAVY_IMPORTS', None)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH')]))
+    script = _STARTUP_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+
+    samples = []
+    heavy = []
+    with tempfile.TemporaryDirectory(prefix='excel_startup_') as workdir:
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', script], cwd=workdir, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            samples.append(result['seconds'])
+            heavy = result['heavy']
+
+    return {'module': module, 'seconds': statistics.median(samples), 'samples': samples, 'heavy': heavy}
+
+
+def run_startup(args):
+    startup = measure_startup(args.startup_module, runs=args.startup_runs)
+    print(f"import {startup['module']}: {startup['seconds']:.3f}s (trung vị {len(startup['samples'])} lần, "
+          f"ngân sách {args.import_budget:.3f}s)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'startup': startup}, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    if startup['heavy']:
+        print(f"Thư viện nặng bị nạp khi import: {', '.join(startup['heavy'])}")
+        failed = True
+    if startup['seconds'] > args.import_budget:
+        print('Vượt ngân sách thời gian import')
+        failed = True
+    return 1 if failed else 0
+
+
+def _format_mb(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def print_report(label, run):
+    print(f"\n== {label}: {run['skus']} SKU, {run['rows']} dòng, năm {', '.join(run['periods'])} ==")
+    print(f"{'giai đoạn':<10} {'giây':>9} {'RSS MB':>9} {'con MB':>9} {'trace MB':>9} {'file MB':>9}")
+    for stage, result in run['stages'].items():
+        print(f"{stage:<10} {result['seconds']:>9.3f} {_format_mb(result.get('peak_rss_mb')):>9} "
+              f"{_format_mb(result.get('children_rss_mb')):>9} {_format_mb(result.get('traced_peak_mb')):>9} "
+              f"{_format_mb(result.get('size_mb')):>9}")
+    print(f"{'tổng':<10} {run['total_seconds']:>9.3f}")
+
+
+def find_regressions(runs, baseline, tolerance, min_seconds=0.05):
+    """Các giai đoạn chậm hơn baseline quá tolerance (bỏ qua chênh lệch < min_seconds)"""
+    regressions = []
+    for label, run in runs.items():
+        previous = baseline.get('runs', {}).get(label)
+        if previous is None:
+            continue
+        for stage, result in run['stages'].items():
+            before = previous['stages'].get(stage, {}).get('seconds')
+            if before is None:
+                continue
+            after = result['seconds']
+            if after > before * (1 + tolerance) and after - before > min_seconds:
+                regressions.append(f"{label} {stage}: {before:.3f}s -> {after:.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ExcelProcessor trên workbook synthetic')
+    parser.add_argument('--skus', type=int, nargs='+', default=[100], help='số SKU mỗi file (có thể nhiều giá trị)')
+    parser.add_argument('--weeks', type=int, default=52, help='số dòng (tuần) của mỗi SKU trong mỗi năm')
+    parser.add_argument('--years', nargs='+', default=['2024', '2025'], help='tên các sheet năm')
+    parser.add_argument('--files', type=int, default=1, help='số file upload (SKU khác nhau giữa các file)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chart-mode', choices=['image', 'native'], default='image')
+    parser.add_argument('--chart-profile', choices=sorted(RENDER_PROFILES), default=DEFAULT_RENDER_PROFILE)
+    parser.add_argument('--ingest-workers', type=int, default=os.cpu_count() or 1, help='số process đọc file song song')
+    parser.add_argument('--extract-cache', help='thư mục cache trích xuất (chạy lại cùng file sẽ lấy từ cache)')
+    parser.add_argument('--chart-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--writer', choices=['standard', 'streaming'], default='standard')
+    parser.add_argument('--log-level', default='WARNING', help='mức log của bộ xử lý (INFO/DEBUG để xem chi tiết)')
+    parser.add_argument('--trace-memory', action='store_true', help='đo thêm peak bộ nhớ bằng tracemalloc (chậm)')
+    parser.add_argument('--workdir', help='thư mục chứa file synthetic và output (file đã có được dùng lại; mặc định: thư mục tạm, xóa sau khi chạy)')
+    parser.add_argument('--json', help='ghi kết quả ra file JSON')
+    parser.add_argument('--baseline', help='file JSON của lần chạy trước để phát hiện chậm đi')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='ngưỡng chậm hơn cho phép so với baseline (0.2 = 20%%)')
+    parser.add_argument('--startup', action='store_true', help='chỉ đo thời gian khởi động (import app)')
+    parser.add_argument('--startup-module', default='app', help='module được import khi đo khởi động')
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--import-budget', type=float, default=1.0, help='thời gian import tối đa (giây)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+
+    if args.startup:
+        return run_startup(args)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='excel_benchmark_')
+    os.makedirs(workdir, exist_ok=True)
+
+    extract_cache = DiskLRUCache(args.extract_cache, suffix='.pkl') if args.extract_cache else None
+
+    runs = {}
+    try:
+        for n_skus in args.skus:
+            label = f'{n_skus}x{args.weeks}x{len(args.years)}x{args.files}'
+            file_paths = []
+            started = time.perf_counter()
+            generated = 0
+            for file_number in range(args.files):
+                # File đã có trong workdir được dùng lại: tạo lại sẽ khác byte (thời điểm
+                # lưu) và không bao giờ trúng cache trích xuất
+                name = f"synthetic_{label}_{'-'.join(args.years)}_seed{args.seed + file_number}_{file_number}.xlsx"
+                path = os.path.join(workdir, name)
+                if not os.path.exists(path):
+                    generate_workbook(path, n_skus, args.weeks, args.years,
+                                      seed=args.seed + file_number, sku_offset=file_number * n_skus)
+                    generated += 1
+                file_paths.append(path)
+            print(f"Tạo {generated}/{args.files} file synthetic {label} trong {time.perf_counter() - started:.1f}s")
+
+            runs[label] = run_benchmark(
+                file_paths,
+                workdir,
+                trace_memory=args.trace_memory,
+                max_workers=args.ingest_workers,
+                extract_cache=extract_cache,
+                chart_workers=args.chart_workers,
+                chart_profile=args.chart_profile,
+                chart_mode=args.chart_mode,
+                writer_mode=args.writer
+            )
+            print_report(label, runs[label])
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    settings = {
+        'weeks': args.weeks,
+        'years': args.years,
+        'files': args.files,
+        'ingest_workers': args.ingest_workers,
+        'extract_cache': bool(args.extract_cache),
+        'chart_mode': args.chart_mode,
+        'chart_profile': args.chart_profile,
+        'chart_workers': args.chart_workers,
+        'writer': args.writer,
+        'trace_memory': args.trace_memory
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'runs': runs}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print('Cảnh báo: thiết lập benchmark khác với baseline')
+        regressions = find_regressions(runs, baseline, args.tolerance)
+        if regressions:
+            print('\nChậm hơn baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('\nKhông có giai đoạn nào chậm hơn baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import functools
+import json
+import os
+
+# Tăng khi thay đổi cấu trúc file để bỏ qua các file cũ
+CHART_INDEX_VERSION = '2'
+
+
+def chart_index_path(output_path):
+    """File spec biểu đồ nằm cạnh file output: `<tên file>.charts.json`"""
+    return os.path.splitext(output_path)[0] + '.charts.json'
+
+
+def save_chart_index(output_path, charts):
+    """Ghi spec biểu đồ của báo cáo: {sku: {năm: {loại biểu đồ: {'spec', 'width', 'profile'}}}}
+
+    spec chưa gồm dpi/nén (xem chart_renderer.render_settings), width là chiều
+    rộng hiển thị (pixel) và profile là hồ sơ độ phân giải của lần chạy, dùng
+    để tính dpi khi vẽ lại.
+    """
+    with open(chart_index_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump({'version': CHART_INDEX_VERSION, 'charts': charts}, f, ensure_ascii=False)
+
+
+def load_chart_index(output_path):
+    """Spec biểu đồ của một báo cáo, None nếu không có hoặc không dùng được
+
+    Kết quả được cache trong bộ nhớ theo thời điểm sửa file (không được sửa
+    dict trả về).
+    """
+    path = chart_index_path(output_path)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _read_chart_index(path, modified)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_chart_index(path, modified):
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('version') != CHART_INDEX_VERSION:
+        return None
+    return index['charts']
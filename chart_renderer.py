@@ -0,0 +1,432 @@
+import abc
+import io
+import json
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from disk_cache import DiskLRUCache
+
+# matplotlib và PIL chỉ được nạp khi vẽ biểu đồ đầu tiên: import module này
+# (app, process đọc file, chế độ biểu đồ Excel gốc) không phải trả chi phí đó.
+
+# Tăng khi thay đổi cách vẽ để bỏ qua các ảnh cũ trong cache
+CHART_CACHE_VERSION = '2'
+
+
+# Hồ sơ độ phân giải: 'scale' = số pixel ảnh trên mỗi pixel hiển thị trong Excel
+# (dpi được tính theo kích thước khung hiển thị), 'dpi' = dpi cố định.
+# 'quantize' = nén PNG về bảng 256 màu.
+RENDER_PROFILES = {
+    'draft': {'scale': 1, 'quantize': True},
+    'screen': {'scale': 2, 'quantize': True},
+    'print': {'dpi': 300, 'quantize': False},
+}
+
+DEFAULT_RENDER_PROFILE = 'print'
+
+# dpi của hồ sơ 'print' - dùng làm mốc để tính dung lượng tiết kiệm được
+PRINT_DPI = RENDER_PROFILES['print']['dpi']
+
+
+def render_settings(profile, figsize, display_width):
+    """dpi và kiểu nén cho biểu đồ figsize (inch) hiển thị rộng display_width pixel"""
+    settings = RENDER_PROFILES[profile]
+    if 'dpi' in settings:
+        dpi = settings['dpi']
+    else:
+        dpi = max(1, round(display_width * settings['scale'] / figsize[0]))
+    return {'dpi': dpi, 'quantize': settings['quantize']}
+
+
+# Spec biểu đồ là dict thuần (chỉ gồm chuỗi, số, list) để gửi được sang process con:
+#   {'kind': 'revenue', 'title', 'labels', 'revenue', 'ad_cost' (hoặc None)}
+#   {'kind': 'tacos', 'title', 'labels', 'tacos', 'safe_line'}
+#   {'kind': 'comparison', 'years', 'quantities', 'revenues', 'ad_spents'}
+# cùng với 'figsize', 'dpi' và 'quantize' (xem render_settings).
+
+
+def preload():
+    """Nạp trước matplotlib và PIL (vd. trong process master trước khi fork worker)"""
+    import matplotlib.backends.backend_agg  # noqa: F401
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.style  # noqa: F401
+    import matplotlib.ticker  # noqa: F401
+    import PIL.Image  # noqa: F401
+
+
+def _new_figure(spec):
+    """Tạo Figure độc lập với pyplot (không dùng trạng thái toàn cục)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec['figsize'])
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _to_png(fig, spec):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=spec['dpi'], bbox_inches='tight')
+
+    if spec.get('quantize'):
+        from PIL import Image as PILImage
+
+        # Biểu đồ chỉ có vài màu nên bảng 256 màu không làm mất chi tiết
+        image = PILImage.open(buffer).convert('RGB').quantize(colors=256)
+        buffer = io.BytesIO()
+        image.save(buffer, format='png', optimize=True)
+
+    return buffer.getvalue()
+
+
+def png_size(png_bytes):
+    """(rộng, cao) pixel đọc từ header IHDR của PNG"""
+    return struct.unpack('>II', png_bytes[16:24])
+
+
+def png_file_size(path):
+    """(rộng, cao, số byte) của một file PNG, chỉ đọc phần header"""
+    with open(path, 'rb') as f:
+        width, height = png_size(f.read(24))
+    return width, height, os.path.getsize(path)
+
+
+class _ChartTemplate(abc.ABC):
+    """Bố cục biểu đồ dựng một lần, mỗi lần vẽ chỉ thay dữ liệu
+
+    Figure, trục, cột, đường, formatter, chú thích và tick được tạo khi dựng
+    template; render(spec) chỉ cập nhật chiều cao cột, dữ liệu đường, nhãn
+    trục X, tiêu đề và giới hạn trục rồi lưu PNG.
+    """
+
+    def __init__(self, spec, points, with_line):
+        self.points = points
+        self.fig = _new_figure(spec)
+        self.ax = self.fig.add_subplot()
+        self.line = None
+        self._build(spec, with_line)
+
+    @abc.abstractmethod
+    def _build(self, spec, with_line):
+        """Tạo trục, cột, đường... (self.line nếu with_line) cho một loại biểu đồ"""
+
+    @abc.abstractmethod
+    def _update(self, spec, positions):
+        """Thay dữ liệu của spec vào các đối tượng đã dựng"""
+
+    @staticmethod
+    def category_positions(labels):
+        """Vị trí cột theo trục phân loại của matplotlib (nhãn trùng nhau dùng chung một vị trí)"""
+        positions = {}
+        return [positions.setdefault(label, len(positions)) for label in labels]
+
+    def _set_bars(self, bars, positions, heights):
+        for bar, position, height in zip(bars, positions, heights):
+            bar.set_x(position - bar.get_width() / 2)
+            bar.set_height(height)
+
+    def _set_ticks(self, ax, labels):
+        ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right', fontsize=9)
+
+    def render(self, spec):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.text import Text
+
+        self._update(spec, self.category_positions(spec['labels']))
+        self.fig.tight_layout()
+        png = _to_png(self.fig, spec)
+
+        # Không giữ lại renderer của lần lưu (bộ đệm RGBA theo dpi ảnh, ~40MB với hồ
+        # sơ 'print'; renderer luôn được tạo lại ở lần vẽ sau): gắn canvas mới và bỏ
+        # renderer mà các Text đã cache (giống Text.__getstate__)
+        FigureCanvasAgg(self.fig)
+        for text in self.fig.findobj(Text):
+            text._renderer = None
+        return png
+
+
+class _RevenueTemplate(_ChartTemplate):
+    """Biểu đồ Doanh số (cột) + Chi phí quảng cáo (đường, trục phải)"""
+
+    def _build(self, spec, with_line):
+        from matplotlib.ticker import FuncFormatter
+
+        ax1 = self.ax
+        # Cột doanh số
+        self.bars = ax1.bar(range(self.points), [0] * self.points, color='#1F4E78', alpha=0.8, label='Tổng doanh số')
+
+        # Định dạng trục Y trái (doanh số)
+        ax1.set_ylabel('Tổng doanh số ($)', fontweight='bold')
+        ax1.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x:,.0f}'))
+        self.default_locator = ax1.yaxis.get_major_locator()
+        ax1.grid(True, alpha=0.3)
+
+        # Trục đang active (tiêu đề và nhãn trục X được đặt lên trục này)
+        self.current_ax = ax1
+
+        # Đường chi phí quảng cáo (nếu có)
+        if with_line:
+            ax2 = ax1.twinx()
+            (self.line,) = ax2.plot(range(self.points), [0] * self.points, color='#C00000', linewidth=3,
+                                    marker='o', label='Chi phí quảng cáo')
+            ax2.set_ylabel('Chi phí quảng cáo ($)', fontweight='bold')
+            ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x:,.0f}'))
+
+            # Kết hợp chú thích của cả 2 trục
+            lines1, labels1 = ax1.get_legend_handles_labels()
+            lines2, labels2 = ax2.get_legend_handles_labels()
+            ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left', frameon=True, fancybox=True, shadow=True)
+            self.current_ax = ax2
+        else:
+            # Chỉ có chú thích doanh số
+            ax1.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
+
+        self.title = self.current_ax.set_title('', fontsize=16, fontweight='bold', color='#C00000')
+        ax1.tick_params(axis='x', which='major', pad=5)
+
+    def _update(self, spec, positions):
+        ax1 = self.ax
+        revenue_data = spec['revenue']
+        self._set_bars(self.bars, positions, revenue_data)
+        ax1.relim()
+        ax1.set_autoscale_on(True)
+        ax1.autoscale_view()
+
+        # Thiết lập 5 mốc cho trục Y
+        if max(revenue_data) > 0:
+            max_rounded = math.ceil(max(revenue_data) / 500) * 500
+            ax1.set_ylim(0, max_rounded)
+            ax1.set_yticks([i * max_rounded / 4 for i in range(5)])
+        else:
+            ax1.yaxis.set_major_locator(self.default_locator)
+
+        if self.line is not None:
+            self.line.set_data(positions, spec['ad_cost'])
+            self.current_ax.relim()
+            self.current_ax.autoscale_view()
+
+        self.title.set_text(spec['title'])
+        # Hiển thị tất cả nhãn trục X (xoay 45 độ)
+        self._set_ticks(self.current_ax, spec['labels'])
+
+
+class _TacosTemplate(_ChartTemplate):
+    """Biểu đồ TACOS (cột) + đường TACOS an toàn 30%"""
+
+    def _build(self, spec, with_line):
+        from matplotlib.ticker import FuncFormatter
+
+        ax = self.ax
+        # Cột TACOS
+        self.bars = ax.bar(range(self.points), [0] * self.points, color='#1F4E78', alpha=0.8, label='TACOS')
+
+        # Đường TACOS an toàn 30%
+        if with_line:
+            (self.line,) = ax.plot(range(self.points), [0.30] * self.points, color='#C00000', linewidth=3,
+                                   label='TACOS an toàn (30%)', linestyle='--')
+
+        # Định dạng trục Y
+        ax.set_ylabel('TACOS (%)', fontweight='bold')
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x:.0%}'))
+        ax.grid(True, alpha=0.3)
+
+        self.title = ax.set_title('', fontsize=16, fontweight='bold', color='#C00000')
+        ax.tick_params(axis='x', which='major', pad=5)
+        ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
+
+    def _update(self, spec, positions):
+        ax = self.ax
+        tacos_data = spec['tacos']
+        self._set_bars(self.bars, positions, tacos_data)
+        if self.line is not None:
+            self.line.set_data(positions, [0.30] * len(positions))
+        ax.relim()
+        ax.set_autoscale_on(True)
+        ax.autoscale_view()
+
+        ax.set_ylim(0, max(0.6, max(tacos_data, default=0) * 1.1))
+        ax.set_yticks([i * 0.1 for i in range(7)])  # 0%, 10%, 20%, ..., 60%
+
+        self.title.set_text(spec['title'])
+        self._set_ticks(ax, spec['labels'])
+
+
+# Template dựng sẵn của mỗi luồng vẽ (mỗi process con trong pool có bộ riêng),
+# theo (loại, figsize, số điểm dữ liệu, có đường hay không)
+_templates = threading.local()
+_MAX_TEMPLATES = 16
+
+
+def _render_from_template(template_class, spec, with_line):
+    cache = getattr(_templates, 'cache', None)
+    if cache is None:
+        cache = _templates.cache = OrderedDict()
+
+    key = (spec['kind'], tuple(spec['figsize']), len(spec['labels']), with_line)
+    template = cache.get(key)
+    if template is None:
+        template = template_class(spec, len(spec['labels']), with_line)
+        cache[key] = template
+        if len(cache) > _MAX_TEMPLATES:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return template.render(spec)
+
+
+def _render_revenue(spec):
+    """Biểu đồ Doanh số (cột) + Chi phí quảng cáo (đường, trục phải)"""
+    return _render_from_template(_RevenueTemplate, spec, spec['ad_cost'] is not None)
+
+
+def _render_tacos(spec):
+    """Biểu đồ TACOS (cột) + đường TACOS an toàn 30%"""
+    return _render_from_template(_TacosTemplate, spec, bool(spec['safe_line']))
+
+
+def _render_comparison(spec):
+    """Biểu đồ cột so sánh Số lượng / Doanh số / Ad spent giữa các năm"""
+    from matplotlib.ticker import FuncFormatter
+
+    fig = _new_figure(spec)
+    ax = fig.add_subplot()
+
+    years = spec['years']
+    x = range(len(years))
+    width = 0.25
+
+    ax.bar([i - width for i in x], spec['quantities'], width, label='Số lượng bán ra', color='#1F4E78', alpha=0.8)
+    ax.bar(x, spec['revenues'], width, label='Tổng doanh số', color='#C00000', alpha=0.8)
+    ax.bar([i + width for i in x], spec['ad_spents'], width, label='Tổng Ad spent', color='#FFC000', alpha=0.8)
+
+    ax.set_xlabel('Năm', fontweight='bold')
+    ax.set_ylabel('Giá trị', fontweight='bold')
+    ax.set_title('Số lượng bán ra and Tổng doanh số', fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(years)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1))
+    ax.grid(True, alpha=0.3)
+
+    # Định dạng trục Y với dấu phẩy
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x:,.0f}'))
+
+    fig.tight_layout()
+    return _to_png(fig, spec)
+
+
+_RENDERERS = {
+    'revenue': _render_revenue,
+    'tacos': _render_tacos,
+    'comparison': _render_comparison,
+}
+
+
+def render_chart(spec):
+    """Vẽ một spec biểu đồ, trả về nội dung PNG (bytes)"""
+    from matplotlib import style
+
+    with style.context('default'):
+        return _RENDERERS[spec['kind']](spec)
+
+
+def chart_cache_key(spec):
+    """Khóa cache của biểu đồ: hash của toàn bộ dữ liệu, nhãn, tiêu đề và thiết lập vẽ"""
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str)
+    return DiskLRUCache.make_key(CHART_CACHE_VERSION, payload)
+
+
+class ChartRenderer:
+    """Vẽ nhiều biểu đồ, song song bằng process pool nếu max_workers > 1
+
+    Nếu có cache (DiskLRUCache), biểu đồ có spec giống hệt lần trước được lấy
+    lại từ cache, chỉ những biểu đồ mới/thay đổi mới phải vẽ.
+
+    progress_callback(done, total) (nếu có) được gọi sau mỗi biểu đồ vẽ xong.
+    """
+
+    # Số biểu đồ vẽ mỗi lô trong render_to_files (giới hạn số ảnh nằm trong bộ nhớ)
+    batch_size = 64
+
+    def __init__(self, max_workers=1, cache=None, progress_callback=None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.progress_callback = progress_callback
+        self.cache_hits = 0
+        self.stats = {}
+        self._done = 0
+        self._total = 0
+
+    def _report(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self._done, self._total)
+
+    def render_to_files(self, specs, directory):
+        """Vẽ specs thành file PNG trong directory, trả về đường dẫn theo đúng thứ tự specs
+
+        Bytes ảnh không được giữ lại: ảnh có trong cache được link sang directory,
+        ảnh còn thiếu (mỗi khóa một lần) được vẽ theo từng lô batch_size trên cùng
+        một process pool và ghi ra file ngay.
+        """
+        keys = [chart_cache_key(spec) for spec in specs]
+        paths = [os.path.join(directory, f'{key}.png') for key in keys]
+
+        missing = {}
+        for key, spec, path in zip(keys, specs, paths):
+            if key in missing or os.path.exists(path):
+                continue
+            if self.cache is None or not self.cache.link(key, path):
+                missing[key] = spec
+
+        self.cache_hits = sum(key not in missing for key in keys)
+        self._done = len(specs) - len(missing)
+        self._total = len(specs)
+        self._report()
+
+        items = list(missing.items())
+        workers = min(self.max_workers or 1, len(items))
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                batch_specs = [spec for _, spec in batch]
+                if executor is None:
+                    images = map(render_chart, batch_specs)
+                else:
+                    images = executor.map(render_chart, batch_specs, chunksize=max(1, len(batch) // (workers * 4)))
+                for (key, _), image in zip(batch, images):
+                    with open(os.path.join(directory, f'{key}.png'), 'wb') as f:
+                        f.write(image)
+                    if self.cache is not None:
+                        self.cache.set(key, image)
+                    self._done += 1
+                    self._report()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stats = self._collect_stats(specs, [png_file_size(path) for path in paths])
+        return paths
+
+    def _collect_stats(self, specs, sizes):
+        """Thống kê dung lượng ảnh và phần tiết kiệm được so với hồ sơ 'print'
+
+        sizes: (rộng, cao, số byte PNG) của từng ảnh. raster_bytes là bộ nhớ RGBA
+        khi vẽ; với 'print' được ước tính theo tỉ lệ dpi.
+        """
+        png_bytes = raster_bytes = print_raster_bytes = 0
+        for spec, (width, height, size) in zip(specs, sizes):
+            png_bytes += size
+            raster_bytes += width * height * 4
+            print_raster_bytes += round(width * height * 4 * (PRINT_DPI / spec['dpi']) ** 2)
+
+        return {
+            'charts': len(sizes),
+            'cache_hits': self.cache_hits,
+            'png_bytes': png_bytes,
+            'raster_bytes': raster_bytes,
+            'raster_bytes_saved': max(0, print_raster_bytes - raster_bytes)
+        }
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUCache:
+    """Cache dạng file trên đĩa, khóa theo nội dung (hash), giới hạn dung lượng.
+
+    Mỗi mục là một file `<key><suffix>` trong thư mục cache. Thời điểm sử dụng
+    gần nhất được lưu bằng mtime của file (cập nhật mỗi lần đọc trúng), khi tổng
+    dung lượng vượt max_bytes thì các file cũ nhất bị xóa trước.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, suffix='.bin'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def make_key(*parts):
+        """Tạo khóa sha256 từ các phần (bytes hoặc chuỗi)"""
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            digest.update(part)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}{self.suffix}')
+
+    def _entries(self):
+        """Danh sách (mtime, path, size) của các mục trong cache"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        """Trả về nội dung (bytes) nếu có trong cache, ngược lại None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Đánh dấu vừa được sử dụng
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def link(self, key, dest):
+        """Tạo file dest có nội dung của mục `key` (hard link, không được thì sao chép)
+
+        Trả về False nếu mục không có trong cache. dest vẫn còn nguyên khi mục bị
+        xóa khỏi cache sau đó.
+        """
+        path = self._path(key)
+        try:
+            try:
+                os.link(path, dest)
+            except OSError:
+                if not os.path.exists(path):
+                    return False
+                shutil.copyfile(path, dest)
+            # Đánh dấu vừa được sử dụng
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def set(self, key, data):
+        """Ghi một mục vào cache (ghi ra file tạm rồi đổi tên để tránh file dở dang)"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Lỗi ghi cache %s: %s", path, e)
+            return
+
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Xóa các mục ít được dùng gần đây nhất cho tới khi đủ dung lượng"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
@@ -1,235 +1,330 @@
+import hashlib
+import logging
+import numpy as np
 import pandas as pd
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.drawing.image import Image
 import os
 from datetime import datetime
-import matplotlib
-matplotlib.use('Agg')  # Sử dụng backend không GUI cho Flask
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.ticker import FuncFormatter
-import io
-from PIL import Image as PILImage
+import pickle
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from chart_renderer import ChartRenderer, DEFAULT_RENDER_PROFILE, render_settings
+from disk_cache import DiskLRUCache
+from native_charts import add_native_chart
+from periods import build_time_labels, chart_labels, period_order
+from chart_index import load_chart_index, save_chart_index
+from report_manifest import load_manifest, save_manifest, sku_fingerprint
+from result_store import save_results
+from sku_index import SkuRowIndex, PerformanceIndex
+from sku_store import SkuDataStore
+from kpi import sku_kpis, tacos_fractions
+from metrics import BYTES_WRITTEN, CHARTS, FILES_PROCESSED, ROWS_SCANNED, SKUS_MATCHED, StageTimer
+from schema import SchemaResolver
+from workbook_loader import WorkbookLoader
+from workbook_writer import (
+    StandardWorkbookWriter, StreamingWorkbookWriter,
+    HEADER_FILL, HEADER_FONT, HEADER_ALIGNMENT
+)
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi thay đổi cách trích xuất để bỏ qua kết quả cũ trong cache
+EXTRACT_CACHE_VERSION = '3'
+
+# Cột phụ (chế độ native): TACOS dạng số tỉ lệ cho biểu đồ Excel gốc, vì cột TACOS
+# gốc thường là chuỗi "8.81%" (Excel vẽ thành 0) hoặc số theo % (25 = 25%)
+TACOS_CHART_COLUMN = 'TACOS biểu đồ'
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """sha256 nội dung file (đọc theo từng chunk)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_cache_key(file_path, loader, sha256=None):
+    """Khóa cache kết quả trích xuất: nội dung file + các sheet năm cần đọc
+
+    sha256: hash nội dung đã biết (vd tính lúc nhận upload), None thì đọc file để tính.
+    """
+    if sha256 is None:
+        sha256 = file_sha256(file_path)
+    return DiskLRUCache.make_key(EXTRACT_CACHE_VERSION, sha256, loader.cache_token())
+
+
+def extract_file(file_path, loader=None):
+    """Đọc một file và trích xuất dữ liệu theo SKU (chạy được trong process con)
+
+    Trả về dict gồm chỉ mục Performance của file, danh sách SKU theo thứ tự và
+    {năm: {'rows': các dòng khớp SKU, 'skus': SKU của từng dòng}} (dòng được
+    nhóm theo SKU, giữ thứ tự dòng trong sheet).
+    """
+    if loader is None:
+        loader = WorkbookLoader()
+    
+    # Chỉ đọc sheet Performance (hoặc sheet đầu tiên) và các sheet năm
+    performance_sheet, year_sheets = loader.load(file_path)
+    return extract_sheets(performance_sheet, year_sheets)
+
+
+def extract_sheets(performance_sheet, year_sheets):
+    """Trích xuất dữ liệu theo SKU từ các sheet đã đọc (xem extract_file)"""
+    # Lấy danh sách SKU (vai trò cột được xác định một lần cho cả file)
+    performance_index = PerformanceIndex()
+    skus = performance_index.add_sheet(performance_sheet)
+    
+    # Dựng chỉ mục SKU -> dòng cho mỗi sheet năm (quét sheet một lần)
+    pieces = {}
+    for year, year_df in year_sheets.items():
+        year_index = SkuRowIndex(year_df)
+        matches = year_index.match(skus)
+        if not matches:
+            continue
+        
+        pieces[year] = {
+            'rows': year_index.rows(np.concatenate(list(matches.values()))),
+            'skus': np.repeat(np.array(list(matches), dtype=object), [len(positions) for positions in matches.values()])
+        }
+    
+    return {
+        'performance_index': performance_index,
+        'skus': skus,
+        'pieces': pieces,
+        'rows_scanned': sum(len(year_df) for year_df in year_sheets.values())
+    }
+
 
 class ExcelProcessor:
-    def __init__(self, file_paths):
+    def __init__(self, file_paths, max_workers=1, chart_workers=1, chart_cache=None,
+                 chart_profile=DEFAULT_RENDER_PROFILE, chart_mode='image', writer_mode='standard',
+                 progress_callback=None, extract_cache=None, schema=None, file_hashes=None):
         self.file_paths = file_paths
+        # {đường dẫn: sha256} của các file đã biết hash (upload_spool tính khi nhận file),
+        # file không có trong đây được hash lại khi tra extract_cache
+        self.file_hashes = file_hashes or {}
+        self.max_workers = max_workers
+        self.chart_workers = chart_workers
+        self.chart_cache = chart_cache
+        self.chart_profile = chart_profile
+        self.chart_mode = chart_mode  # 'image' (ảnh matplotlib) hoặc 'native' (biểu đồ Excel)
+        self.writer_mode = writer_mode  # 'standard' (pd.ExcelWriter) hoặc 'streaming' (write_only)
+        # progress_callback(stage, done, total): báo tiến độ theo giai đoạn
+        # ('parsing', 'merging', 'aggregating', 'sku_sheets', 'charts', 'formatting')
+        self.progress_callback = progress_callback
+        # DiskLRUCache lưu kết quả extract_file theo hash nội dung file:
+        # upload lại cùng một file sẽ không phải parse Excel lần nữa
+        self.extract_cache = extract_cache
+        self.extract_cache_hits = 0
+        # Nhận diện vai trò cột (cache theo bộ header, có thể kèm override của người dùng)
+        self.schema = schema or SchemaResolver()
+        self.chart_stats = {}
+        self.incremental_stats = {}
+        # Thời gian từng giai đoạn (theo các stage của progress_callback) và chỉ số /metrics
+        self.stage_timer = StageTimer()
         self.data = {}
+        self.periods = []
+        self.performance_index = PerformanceIndex()
+        self.loader = WorkbookLoader()
+    
+    def _report_progress(self, stage, done=None, total=None):
+        self.stage_timer.start(stage)
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+    
+    def _extract_all(self):
+        """Trích xuất từng file, song song bằng process pool nếu max_workers > 1
+
+        File đã có trong extract_cache được lấy lại từ cache, chỉ các file còn
+        lại mới phải parse. Kết quả luôn được trả về theo đúng thứ tự file_paths.
+        """
+        total = len(self.file_paths)
+        results = [None] * total
+        keys = [None] * total
+        
+        if self.extract_cache is not None:
+            for i, file_path in enumerate(self.file_paths):
+                keys[i] = extract_cache_key(file_path, self.loader, self.file_hashes.get(file_path))
+                results[i] = self._load_cached_extract(keys[i])
+        
+        self.extract_cache_hits = sum(result is not None for result in results)
+        FILES_PROCESSED.inc(self.extract_cache_hits, source='cache')
+        done = self.extract_cache_hits
+        self._report_progress('parsing', done, total)
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        for i, extracted in zip(missing, self._extract_files([self.file_paths[i] for i in missing])):
+            results[i] = extracted
+            FILES_PROCESSED.inc(source='parsed')
+            ROWS_SCANNED.inc(extracted['rows_scanned'])
+            if self.extract_cache is not None:
+                self.extract_cache.set(keys[i], pickle.dumps(extracted, protocol=pickle.HIGHEST_PROTOCOL))
+            done += 1
+            self._report_progress('parsing', done, total)
+        
+        if self.extract_cache_hits:
+            logger.info("Lấy %d/%d file từ cache (bỏ qua parse Excel)", self.extract_cache_hits, total)
+        
+        return results
+    
+    def _load_cached_extract(self, key):
+        data = self.extract_cache.get(key)
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logger.warning("Lỗi đọc cache trích xuất %s: %s", key, e)
+            return None
+    
+    def _extract_files(self, file_paths):
+        """Parse các file, trả về kết quả lần lượt theo thứ tự file_paths"""
+        workers = min(self.max_workers or 1, len(file_paths))
+        if workers <= 1:
+            for file_path in file_paths:
+                yield extract_file(file_path, self.loader)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(extract_file, file_paths, repeat(self.loader))
         
     def process(self):
         """Xử lý các file Excel và trích xuất dữ liệu theo SKU"""
         try:
-            all_skus = set()
-            
-            # Đọc tất cả các file
-            for file_path in self.file_paths:
-                df_dict = pd.read_excel(file_path, sheet_name=None)
-                
-                # Tìm sheet Performance hoặc sheet chứa danh sách SKU
-                performance_sheet = None
-                for sheet_name in df_dict.keys():
-                    if 'performance' in sheet_name.lower() or 'tổng' in sheet_name.lower():
-                        performance_sheet = df_dict[sheet_name]
-                        break
-                
-                if performance_sheet is None:
-                    # Nếu không tìm thấy, lấy sheet đầu tiên
-                    performance_sheet = list(df_dict.values())[0]
-                
-                # Tìm cột chứa mã sản phẩm/SKU/ASIN
-                sku_column = None
-                for col in performance_sheet.columns:
-                    col_lower = str(col).lower()
-                    if any(keyword in col_lower for keyword in ['sku', 'asin', 'sản phẩm', 'mã']):
-                        sku_column = col
-                        break
-                
-                if sku_column is None:
-                    # Lấy cột thứ 2 (thường là ASIN)
-                    sku_column = performance_sheet.columns[1] if len(performance_sheet.columns) > 1 else performance_sheet.columns[0]
-                
-                # Lấy danh sách SKU
-                skus = performance_sheet[sku_column].dropna().unique()
-                all_skus.update(skus)
-                
-                # Xử lý từng SKU
-                for sku in skus:
-                    if sku not in self.data:
-                        self.data[sku] = {
-                            'product_name': None,
-                            '2024': pd.DataFrame(),
-                            '2025': pd.DataFrame()
-                        }
-                    
-                    # Lấy tên sản phẩm
-                    product_col = None
-                    for col in performance_sheet.columns:
-                        if 'sản phẩm' in str(col).lower() or 'product' in str(col).lower():
-                            product_col = col
-                            break
-                    
-                    if product_col:
-                        product_row = performance_sheet[performance_sheet[sku_column] == sku]
-                        if not product_row.empty:
-                            self.data[sku]['product_name'] = product_row.iloc[0][product_col]
-                    
-                    # Tìm và lấy dữ liệu từ sheet 2024 và 2025
-                    for year in ['2024', '2025']:
-                        if year in df_dict:
-                            year_df = df_dict[year]
-                            # Tìm dữ liệu của SKU trong sheet năm
-                            sku_data = year_df[year_df.apply(lambda row: row.astype(str).str.contains(str(sku), case=False).any(), axis=1)]
-                            
-                            if not sku_data.empty:
-                                if self.data[sku][year].empty:
-                                    self.data[sku][year] = sku_data
-                                else:
-                                    self.data[sku][year] = pd.concat([self.data[sku][year], sku_data], ignore_index=True)
+            extracted_files = self._extract_all()
             
-            # Lấy tất cả dữ liệu SKU (có thể chỉ có 2024 hoặc chỉ có 2025)
-            filtered_data = {}
-            filtered_skus = []
+            # Gộp chỉ mục Performance theo thứ tự file (file sau ghi đè file trước)
+            for extracted in extracted_files:
+                self.performance_index.update(extracted['performance_index'])
             
-            for sku, sku_data in self.data.items():
-                has_2024 = not sku_data['2024'].empty
-                has_2025 = not sku_data['2025'].empty
-                
-                # Giữ lại SKU nếu có ít nhất 1 năm có dữ liệu
-                if has_2024 or has_2025:
-                    filtered_data[sku] = sku_data
-                    filtered_skus.append(sku)
+            # Nối dòng của mọi SKU/năm vào một bảng dạng dài (một lần concat duy nhất)
+            self._report_progress('merging')
+            self.data = SkuDataStore.from_extracted(extracted_files, self.performance_index)
+            self.periods = self.data.periods
+            SKUS_MATCHED.inc(len(self.data.skus))
             
+            # Chỉ gồm các SKU có dữ liệu ở ít nhất 1 năm
             return {
                 'success': True,
-                'skus': filtered_skus,
-                'data': filtered_data
+                'skus': self.data.skus,
+                'periods': self.periods,
+                'data': self.data
             }
         
         except Exception as e:
             return {'error': f'Lỗi xử lý file Excel: {str(e)}'}
+        
+        finally:
+            self.stage_timer.stop()
     
-    def create_output_excel(self, data):
-        """Tạo file Excel output với sheet riêng cho mỗi SKU"""
+    def create_output_excel(self, data, performance_index=None, previous_output=None, report_id=None):
+        """Tạo file Excel output với sheet riêng cho mỗi SKU
+
+        performance_index: PerformanceIndex dùng để tra tên sản phẩm
+        (mặc định dùng chỉ mục dựng trong process()).
+        previous_output: đường dẫn báo cáo của lần chạy trước. Nếu manifest của
+        báo cáo đó còn dùng được, chỉ các sheet SKU có dữ liệu thay đổi (và sheet
+        TỔNG PERFORMANCE) được tạo lại, các sheet khác được giữ nguyên kèm biểu đồ.
+        report_id: thêm vào tên file (vd job id) để các báo cáo tạo cùng một giây
+        không ghi đè nhau; mặc định là một chuỗi ngẫu nhiên.
+        """
+        if performance_index is None:
+            performance_index = self.performance_index
+        
+        # Ảnh biểu đồ được ghi ra file ở đây và chỉ được openpyxl đọc khi lưu workbook
+        # (cùng ổ đĩa với cache ảnh để link file thay vì sao chép)
+        chart_dir = tempfile.mkdtemp(prefix='charts_', dir=self.chart_cache.directory if self.chart_cache else None)
+        
         try:
+            self.stage_timer.start('preparing')
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_filename = f'analysis_report_{timestamp}.xlsx'
+            output_filename = f'analysis_report_{timestamp}_{report_id or uuid.uuid4().hex[:8]}.xlsx'
             output_path = os.path.join('outputs', output_filename)
             
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                # Tạo dữ liệu cho sheet so sánh 2024 vs 2025
-                comparison_data = []
-                summary_data_2024 = []
-                summary_data_2025 = []
-                
-                for sku, sku_data in data.items():
-                    product_name = sku_data.get('product_name', 'N/A')
-                    
-                    # Dữ liệu 2024
-                    quantity_2024 = revenue_2024 = ad_spent_2024 = 0
-                    if not sku_data['2024'].empty:
-                        quantity_col = self._find_column(sku_data['2024'], ['số lượng bán ra', 'quantity', 'units sold', 'sold'])
-                        revenue_col = self._find_column(sku_data['2024'], ['doanh số', 'revenue', 'tổng doanh', 'sales'])
-                        ad_cost_col = self._find_column(sku_data['2024'], ['chi phí quảng cáo', 'ad cost', 'advertising', 'quảng cáo', 'ad spent'])
-                        
-                        if quantity_col:
-                            quantity_2024 = pd.to_numeric(sku_data['2024'][quantity_col], errors='coerce').fillna(0).sum()
-                        if revenue_col:
-                            revenue_2024 = pd.to_numeric(sku_data['2024'][revenue_col], errors='coerce').fillna(0).sum()
-                        if ad_cost_col:
-                            ad_spent_2024 = pd.to_numeric(sku_data['2024'][ad_cost_col], errors='coerce').fillna(0).sum()
-                    
-                    # Dữ liệu 2025
-                    quantity_2025 = revenue_2025 = ad_spent_2025 = 0
-                    if not sku_data['2025'].empty:
-                        quantity_col = self._find_column(sku_data['2025'], ['số lượng bán ra', 'quantity', 'units sold', 'sold'])
-                        revenue_col = self._find_column(sku_data['2025'], ['doanh số', 'revenue', 'tổng doanh', 'sales'])
-                        ad_cost_col = self._find_column(sku_data['2025'], ['chi phí quảng cáo', 'ad cost', 'advertising', 'quảng cáo', 'ad spent'])
-                        
-                        if quantity_col:
-                            quantity_2025 = pd.to_numeric(sku_data['2025'][quantity_col], errors='coerce').fillna(0).sum()
-                        if revenue_col:
-                            revenue_2025 = pd.to_numeric(sku_data['2025'][revenue_col], errors='coerce').fillna(0).sum()
-                        if ad_cost_col:
-                            ad_spent_2025 = pd.to_numeric(sku_data['2025'][ad_cost_col], errors='coerce').fillna(0).sum()
-                    
-                    # Tính TACOS cho từng năm
-                    tacos_2024 = (ad_spent_2024 / revenue_2024 * 100) if revenue_2024 > 0 else 0
-                    tacos_2025 = (ad_spent_2025 / revenue_2025 * 100) if revenue_2025 > 0 else 0
-                    
-                    # Thêm vào dữ liệu so sánh
-                    comparison_data.append({
-                        'Mã SKU': sku,
-                        'Sản phẩm': product_name,
-                        'Số lượng 2024': int(quantity_2024),
-                        'Doanh số 2024': revenue_2024,
-                        'Ad spent 2024': ad_spent_2024,
-                        'TACOS 2024': f"{tacos_2024:.2f}%",
-                        'Số lượng 2025': int(quantity_2025),
-                        'Doanh số 2025': revenue_2025,
-                        'Ad spent 2025': ad_spent_2025,
-                        'TACOS 2025': f"{tacos_2025:.2f}%"
-                    })
-                    
-                    # Thêm vào dữ liệu 2024
-                    if quantity_2024 > 0 or revenue_2024 > 0:
-                        category_2024 = self._get_category(tacos_2024)
-                        summary_data_2024.append({
-                            'Mã SKU': sku,
-                            'Sản phẩm': product_name,
-                            'Số lượng bán ra': int(quantity_2024),
-                            'Tổng doanh số': revenue_2024,
-                            'Tổng Ad spent': ad_spent_2024,
-                            'Tacos': f"{tacos_2024:.2f}%",
-                            'Phân loại': category_2024
-                        })
-                    
-                    # Thêm vào dữ liệu 2025
-                    if quantity_2025 > 0 or revenue_2025 > 0:
-                        category_2025 = self._get_category(tacos_2025)
-                        summary_data_2025.append({
-                            'Mã SKU': sku,
-                            'Sản phẩm': product_name,
-                            'Số lượng bán ra': int(quantity_2025),
-                            'Tổng doanh số': revenue_2025,
-                            'Tổng Ad spent': ad_spent_2025,
-                            'Tacos': f"{tacos_2025:.2f}%",
-                            'Phân loại': category_2025
-                        })
+            if not isinstance(data, SkuDataStore):
+                data = SkuDataStore.from_frames(data)
+            periods = data.periods
+            
+            # Tên sheet và fingerprint dữ liệu của từng SKU (ghi vào manifest)
+            sheet_names = {}
+            manifest_sheets = {}
+            product_names = {}
+            for sku, sku_data in data.items():
+                sheet_names[sku] = self._sheet_name(sku, sku_data, performance_index)
+                product_names[sku] = self._lookup_product_name(sku, sku_data, performance_index)
+                manifest_sheets[str(sku)] = {
+                    'sheet': sheet_names[sku],
+                    'fingerprint': sku_fingerprint(sku_data, product_names[sku], periods)
+                }
+            
+            previous_sheets = self._previous_sheets(previous_output, sheet_names)
+            rebuilt = reused = 0
+            
+            # Spec biểu đồ theo SKU/năm (lưu cạnh file output để xem biểu đồ trên web)
+            chart_index = {}
+            previous_charts = load_chart_index(previous_output) if previous_sheets is not None else None
+            
+            if previous_sheets is not None:
+                # Bắt đầu từ bản sao báo cáo trước, ghi đè các sheet thay đổi
+                shutil.copyfile(previous_output, output_path)
+                book_writer = StandardWorkbookWriter(output_path, formatter=self._format_excel, append=True)
+            elif self.writer_mode == 'streaming':
+                book_writer = StreamingWorkbookWriter(output_path)
+            else:
+                book_writer = StandardWorkbookWriter(output_path, formatter=self._format_excel)
+            
+            with book_writer:
+                # Tạo sheet so sánh giữa các năm (chỉ số tính một lượt cho mọi SKU/năm)
+                self._report_progress('aggregating')
+                kpis = sku_kpis(data, self.schema)
+                comparison_df = self._comparison_table(kpis, data, periods, performance_index)
                 
-                # Tạo sheet so sánh 2024 vs 2025
-                comparison_df = pd.DataFrame(comparison_data)
-                comparison_df.to_excel(writer, sheet_name='TỔNG PERFORMANCE', index=False)
+                # Spec biểu đồ của cả file (được vẽ một lượt ở cuối)
+                chart_placements = []
                 
-                # Thêm biểu đồ so sánh vào sheet TỔNG PERFORMANCE
+                # Bảng tổng hợp + biểu đồ so sánh trong sheet TỔNG PERFORMANCE
+                comparison_summary = None
                 if comparison_df is not None and not comparison_df.empty:
-                    self._add_comparison_chart(writer.book, 'TỔNG PERFORMANCE', comparison_df)
+                    comparison_summary = self._add_comparison_chart('TỔNG PERFORMANCE', comparison_df, periods)
+                
+                if comparison_summary:
+                    book_writer.write_sheet(
+                        'TỔNG PERFORMANCE',
+                        comparison_df,
+                        extra_rows=comparison_summary['rows'],
+                        extra_start_row=comparison_summary['start_row']
+                    )
+                    chart_placements.append(comparison_summary['chart'])
+                else:
+                    book_writer.write_sheet('TỔNG PERFORMANCE', comparison_df)
                 
                 # Tạo sheet cho từng SKU + chèn biểu đồ trực tiếp trong Excel
-                for sku, sku_data in data.items():
-                    # Sử dụng tên sản phẩm làm tên sheet
-                    product_name = sku_data.get('product_name', str(sku))
-                    if not product_name or product_name == 'N/A' or pd.isna(product_name):
-                        product_name = str(sku)
+                self._report_progress('sku_sheets', 0, len(data))
+                for sku_number, (sku, sku_data) in enumerate(data.items(), 1):
+                    sheet_name = sheet_names[sku]
                     
-                    # Làm sạch tên sheet (Excel giới hạn 31 ký tự, không chứa ký tự đặc biệt)
-                    sheet_name = str(product_name)[:31]
-                    # Loại bỏ ký tự không hợp lệ cho tên sheet Excel
-                    invalid_chars = ['[', ']', '*', '?', ':', '\\', '/']
-                    for char in invalid_chars:
-                        sheet_name = sheet_name.replace(char, '')
-
+                    # Dữ liệu không đổi so với lần chạy trước: giữ nguyên sheet cũ
+                    if previous_sheets is not None and previous_sheets.get(str(sku)) == manifest_sheets[str(sku)]:
+                        reused += 1
+                        if str(sku) in previous_charts:
+                            chart_index[str(sku)] = previous_charts[str(sku)]
+                        self._report_progress('sku_sheets', sku_number, len(data))
+                        continue
+                    
+                    rebuilt += 1
                     combined_data = []
-                    if not sku_data['2024'].empty:
-                        df_2024 = sku_data['2024'].copy()
-                        df_2024.insert(0, 'Năm', '2024')
-                        combined_data.append(df_2024)
-
-                    if not sku_data['2025'].empty:
-                        df_2025 = sku_data['2025'].copy()
-                        df_2025.insert(0, 'Năm', '2025')
-                        combined_data.append(df_2025)
+                    for year in periods:
+                        if not sku_data[year].empty:
+                            year_df = sku_data[year].copy()
+                            year_df.insert(0, 'Năm', year)
+                            combined_data.append(year_df)
 
                     if combined_data:
                         combined_df = pd.concat(combined_data, ignore_index=True)
@@ -244,45 +339,167 @@ class ExcelProcessor:
                         if 'Tacos an toàn' not in combined_df.columns:
                             combined_df['Tacos an toàn'] = 0.30
                         
-                        combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                        if self.chart_mode == 'native':
+                            combined_df = self._add_tacos_chart_column(combined_df)
+                        
+                        sheet_name = book_writer.write_sheet(sheet_name, combined_df)
 
                         # Thêm biểu đồ trực tiếp vào sheet SKU
-                        product_name = sku_data.get('product_name')
-                        self._add_charts_to_sheet(
-                            writer.book,
+                        product_name = self._lookup_product_name(sku, sku_data, performance_index)
+                        sku_placements = self._build_chart_specs(
                             sheet_name,
                             combined_df,
                             product_name=product_name,
                             sku=str(sku)
                         )
+                        chart_placements.extend(sku_placements)
+                        
+                        for placement in sku_placements:
+                            charts = chart_index.setdefault(str(sku), {}).setdefault(placement['year'], {})
+                            charts[placement['spec']['kind']] = {
+                                'spec': dict(placement['spec']),
+                                'width': placement['width'],
+                                'profile': self.chart_profile
+                            }
+                    
+                    self._report_progress('sku_sheets', sku_number, len(data))
+                
+                if previous_sheets is not None:
+                    self._arrange_sheets(book_writer.book, ['TỔNG PERFORMANCE'] + list(sheet_names.values()))
                 
-                # Định dạng file Excel
-                self._format_excel(writer)
+                # Vẽ và chèn tất cả biểu đồ
+                self._report_progress('charts', 0, len(chart_placements))
+                self._insert_charts(book_writer.book, chart_placements, chart_dir)
+                
+                # Định dạng file Excel: chế độ standard định dạng khi đóng writer,
+                # chế độ streaming đã định dạng trong lúc ghi từng dòng
+                self._report_progress('formatting')
+            
+            self.stage_timer.stop()
+            BYTES_WRITTEN.inc(os.path.getsize(output_path))
+            save_manifest(output_path, self._report_settings(), manifest_sheets)
+            save_chart_index(output_path, chart_index)
+            save_results(output_path, kpis, product_names)
+            self.incremental_stats = {
+                'incremental': previous_sheets is not None,
+                'rebuilt': rebuilt,
+                'reused': reused
+            }
+            if previous_sheets is not None:
+                logger.info("Tạo lại %d sheet SKU, giữ nguyên %d sheet từ báo cáo trước", rebuilt, reused)
             
             return output_filename
         
         except Exception as e:
-            print(f"Lỗi tạo file Excel: {str(e)}")
+            logger.exception("Lỗi tạo file Excel: %s", e)
+            return None
+        
+        finally:
+            self.stage_timer.stop()
+            shutil.rmtree(chart_dir, ignore_errors=True)
+    
+    def kpi_summary(self, data=None):
+        """Bảng chỉ số theo SKU/năm (số lượng, doanh số, ad spent, TACOS, phân loại)
+
+        data: SkuDataStore hoặc dict {sku: {năm: DataFrame}} (mặc định dữ liệu của process()).
+        """
+        if data is None:
+            data = self.data
+        if not isinstance(data, SkuDataStore):
+            data = SkuDataStore.from_frames(data)
+        return sku_kpis(data, self.schema)
+    
+    def _comparison_table(self, kpis, data, periods, performance_index):
+        """Bảng so sánh dạng rộng: mỗi SKU một dòng, mỗi năm 4 cột chỉ số"""
+        if kpis.empty:
+            return pd.DataFrame()
+        
+        wide = kpis.pivot(index='sku', columns='year')
+        wide = wide.reindex(data.skus)
+        
+        comparison_df = pd.DataFrame({
+            'Mã SKU': data.skus,
+            'Sản phẩm': [self._lookup_product_name(sku, data[sku], performance_index) for sku in data.skus]
+        })
+        for year in periods:
+            comparison_df[f'Số lượng {year}'] = wide[('quantity', year)].to_numpy().astype(np.int64)
+            comparison_df[f'Doanh số {year}'] = wide[('revenue', year)].to_numpy()
+            comparison_df[f'Ad spent {year}'] = wide[('ad_spent', year)].to_numpy()
+            comparison_df[f'TACOS {year}'] = [f"{tacos:.2f}%" for tacos in wide[('tacos', year)].to_numpy()]
+        return comparison_df
+    
+    def _sheet_name(self, sku, sku_data, performance_index):
+        """Tên sheet của SKU: tên sản phẩm (hoặc mã SKU) đã làm sạch"""
+        # Sử dụng tên sản phẩm làm tên sheet
+        product_name = self._lookup_product_name(sku, sku_data, performance_index)
+        if not product_name or product_name == 'N/A' or pd.isna(product_name):
+            product_name = str(sku)
+        
+        # Làm sạch tên sheet (Excel giới hạn 31 ký tự, không chứa ký tự đặc biệt)
+        sheet_name = str(product_name)[:31]
+        # Loại bỏ ký tự không hợp lệ cho tên sheet Excel
+        invalid_chars = ['[', ']', '*', '?', ':', '\\', '/']
+        for char in invalid_chars:
+            sheet_name = sheet_name.replace(char, '')
+        return sheet_name
+    
+    def _report_settings(self):
+        """Thiết lập ảnh hưởng tới nội dung sheet SKU (lưu trong manifest)"""
+        return {
+            'chart_mode': self.chart_mode,
+            'chart_profile': self.chart_profile,
+            # Override vai trò cột đổi cột được đọc/vẽ dù dữ liệu SKU giống hệt
+            'schema': self.schema.cache_token()
+        }
+    
+    def _previous_sheets(self, previous_output, sheet_names):
+        """{sku: {'sheet', 'fingerprint'}} của báo cáo trước nếu dùng lại được, ngược lại None"""
+        if not previous_output:
+            return None
+        
+        if self.writer_mode == 'streaming':
+            logger.info("Chế độ streaming không hỗ trợ cập nhật tăng dần, tạo lại toàn bộ báo cáo")
             return None
+        
+        manifest = load_manifest(previous_output)
+        if manifest is None or load_chart_index(previous_output) is None or not os.path.exists(previous_output):
+            logger.warning("Không dùng được báo cáo trước %s, tạo lại toàn bộ báo cáo", previous_output)
+            return None
+        
+        if manifest['settings'] != self._report_settings():
+            logger.info("Thiết lập biểu đồ hoặc cột khác lần chạy trước, tạo lại toàn bộ báo cáo")
+            return None
+        
+        # Nhiều SKU cùng tên sheet thì các sheet không thể thay thế độc lập
+        if len(set(sheet_names.values())) < len(sheet_names):
+            logger.info("Có nhiều SKU trùng tên sheet, tạo lại toàn bộ báo cáo")
+            return None
+        
+        return manifest['skus']
     
-    def _find_column(self, df, keywords):
-        """Tìm cột dựa trên từ khóa"""
-        for col in df.columns:
-            col_lower = str(col).lower()
-            if any(keyword in col_lower for keyword in keywords):
-                return col
-        return None
+    def _arrange_sheets(self, workbook, sheet_order):
+        """Xóa sheet của SKU không còn dữ liệu và sắp xếp sheet theo thứ tự mới"""
+        positions = {title: i for i, title in enumerate(sheet_order)}
+        for ws in list(workbook.worksheets):
+            if ws.title not in positions:
+                workbook.remove(ws)
+        
+        # Đưa lần lượt từng sheet về đúng vị trí (sheet đã đúng chỗ thì bỏ qua). Thứ
+        # tự hiện tại được theo dõi trong `current`: workbook.index() dựng lại danh
+        # sách sheet mỗi lần gọi
+        current = list(workbook.worksheets)
+        for target, ws in enumerate(sorted(current, key=lambda ws: positions[ws.title])):
+            index = current.index(ws, target)
+            if index != target:
+                workbook.move_sheet(ws, target - index)
+                current.insert(target, current.pop(index))
+        workbook.active = 0
     
-    def _get_category(self, tacos_percent):
-        """Xác định phân loại dựa trên TACOS"""
-        if tacos_percent == 0:
-            return "Tốt"
-        elif tacos_percent <= 30:
-            return "Tốt" 
-        elif tacos_percent <= 50:
-            return "Xấu"
-        else:
-            return "TB"  # Trung bình
+    def _lookup_product_name(self, sku, sku_data, performance_index):
+        """Lấy tên sản phẩm, ưu tiên tra cứu O(1) từ chỉ mục Performance"""
+        if sku in performance_index:
+            return performance_index.product_name(sku)
+        return sku_data.get('product_name')
     
     def _process_time_columns(self, df):
         """Xử lý và ghép các cột Unnamed thành cột Thời gian"""
@@ -296,47 +513,7 @@ class ExcelProcessor:
                 second_col = unnamed_cols[1]
                 
                 # Tạo cột Thời gian mới với auto-increment cho nan
-                time_values = []
-                month_day_counter = {}  # Đếm ngày cho mỗi tháng khi gặp nan
-                
-                for i in range(len(df)):
-                    first_val = str(df.iloc[i][first_col])
-                    second_val = str(df.iloc[i][second_col])
-                    
-                    if 'nan' in first_val and 'nan' in second_val:
-                        time_values.append('')
-                    elif 'nan' in second_val:
-                        # Trường hợp "Oct - nan"
-                        month_name = first_val.lower()
-                        
-                        # Tự động tăng ngày cho tháng này
-                        if month_name not in month_day_counter:
-                            month_day_counter[month_name] = 1
-                        else:
-                            month_day_counter[month_name] += 1
-                        
-                        # Tạo nhãn với ngày tự động
-                        if month_day_counter[month_name] == 1:
-                            suffix = 'st'
-                        elif month_day_counter[month_name] == 2:
-                            suffix = 'nd'
-                        elif month_day_counter[month_name] == 3:
-                            suffix = 'rd'
-                        else:
-                            suffix = 'th'
-                        
-                        time_val = f"{first_val} - {month_day_counter[month_name]}{suffix}"
-                        time_values.append(time_val)
-                    else:
-                        # Trường hợp bình thường
-                        time_val = first_val + ' - ' + second_val
-                        time_values.append(time_val)
-                
-                df['Thời gian'] = time_values
-                
-                # Làm sạch giá trị (bỏ nan, None...)
-                df['Thời gian'] = df['Thời gian'].replace('nan - nan', '')
-                df['Thời gian'] = df['Thời gian'].replace('None - None', '')
+                df['Thời gian'] = build_time_labels(df[first_col], df[second_col]).to_numpy()
                 
                 # Di chuyển cột Thời gian lên đầu (sau cột Năm nếu có)
                 cols = df.columns.tolist()
@@ -354,87 +531,88 @@ class ExcelProcessor:
             return df
         
         except Exception as e:
-            print(f"Lỗi xử lý cột thời gian: {str(e)}")
+            logger.error("Lỗi xử lý cột thời gian: %s", e)
             return df
 
+    def _add_tacos_chart_column(self, df):
+        """Thêm cột TACOS_CHART_COLUMN (tỉ lệ TACOS chuẩn hóa theo từng năm như ảnh biểu đồ)"""
+        roles = self.schema.resolve(df.columns)
+        tacos_col, year_col = roles['tacos'], roles['year']
+        if tacos_col is None or year_col is None:
+            return df
+        
+        df = df.copy()
+        df[TACOS_CHART_COLUMN] = 0.0
+        for _, positions in df.groupby(df[year_col].astype(str), sort=False).indices.items():
+            df.iloc[positions, df.columns.get_loc(TACOS_CHART_COLUMN)] = tacos_fractions(df[tacos_col].iloc[positions]).to_numpy()
+        return df
+    
     def _style_chart_title(self, chart, title_text, color="C00000", size=1400):
         """Đổi màu/độ đậm tiêu đề chart - phiên bản đơn giản"""
         # Phiên bản openpyxl cũ không hỗ trợ RichText
         # Chỉ set title text đơn giản
         pass
     
-    def _format_excel(self, writer):
-        """Định dạng file Excel"""
+    def _format_excel(self, writer, layouts):
+        """Định dạng file Excel
+
+        layouts: {sheet: [(độ rộng, định dạng số), ...]} tính sẵn từ DataFrame bằng
+        column_layout, nên không phải đo độ dài từng ô sau khi ghi.
+        """
         try:
             workbook = writer.book
             
-            # Định dạng cho tất cả các sheet
-            for sheet_name in workbook.sheetnames:
+            # Định dạng cho các sheet vừa ghi
+            for sheet_name, layout in layouts.items():
                 worksheet = workbook[sheet_name]
                 
                 # Định dạng header
-                header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-                header_font = Font(bold=True, color='FFFFFF', size=11)
-                
                 for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
+                    cell.fill = HEADER_FILL
+                    cell.font = HEADER_FONT
+                    cell.alignment = HEADER_ALIGNMENT
                 
-                # Tự động điều chỉnh độ rộng cột
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    header_value = str(column[0].value).lower() if column[0].value else ""
+                for idx, (width, number_format) in enumerate(layout, 1):
+                    # Độ rộng cột
+                    worksheet.column_dimensions[get_column_letter(idx)].width = width
                     
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-
                     # Định dạng số theo cột
-                    if 'tacos an toàn' in header_value:
-                        for cell in column[1:]:
-                            cell.number_format = '0.00%'
-                    elif 'tacos' in header_value:
-                        for cell in column[1:]:
-                            cell.number_format = '0.00%'
-                    elif any(keyword in header_value for keyword in ['tổng doanh', 'chi phí']):
-                        for cell in column[1:]:
-                            cell.number_format = '"$"#,##0.00'
+                    if number_format:
+                        for (cell,) in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row, min_col=idx, max_col=idx):
+                            cell.number_format = number_format
         
         except Exception as e:
-            print(f"Lỗi định dạng Excel: {str(e)}")
+            logger.error("Lỗi định dạng Excel: %s", e)
 
-    def _add_charts_to_sheet(self, workbook, sheet_name, df, product_name=None, sku=None):
-        """Tạo biểu đồ bằng matplotlib và chèn vào Excel như hình ảnh."""
-        try:
-            ws = workbook[sheet_name]
+    def _build_chart_specs(self, sheet_name, df, product_name=None, sku=None):
+        """Dựng spec biểu đồ (dữ liệu thuần, picklable) cho một sheet SKU.
 
+        Trả về list vị trí chèn: {'sheet', 'year', 'anchor', 'width', 'height', 'spec', 'source'}
+        ('source' là vùng ô dữ liệu dùng cho biểu đồ Excel gốc).
+        Việc vẽ được thực hiện sau bởi ChartRenderer.
+        """
+        placements = []
+        try:
             if df is None or df.empty:
-                print(f"Sheet {sheet_name}: DataFrame rỗng, bỏ qua biểu đồ")
-                return
+                logger.debug("Sheet %s: DataFrame rỗng, bỏ qua biểu đồ", sheet_name)
+                return placements
 
-            year_col = self._find_column(df, ['năm', 'year'])
-            time_col = self._find_column(df, ['thời gian', 'time', 'ngày', 'date', 'tuần', 'week'])
+            roles = self.schema.resolve(df.columns)
+            year_col = roles['year']
+            time_col = roles['time']
             if time_col is None and len(df.columns) > 1:
                 time_col = df.columns[1]
 
-            revenue_col = self._find_column(df, ['tổng doanh số', 'doanh số', 'revenue', 'sales'])
-            ad_cost_col = self._find_column(df, ['chi phí quảng cáo', 'ad cost', 'advertising', 'quảng cáo'])
-            tacos_col = self._find_column(df, ['tacos'])
-            safe_tacos_col = self._find_column(df, ['tacos an toàn', 'tacos an toan', 'safe tacos'])
+            revenue_col = roles['chart_revenue']
+            ad_cost_col = roles['chart_ad_cost']
+            tacos_col = roles['tacos']
+            safe_tacos_col = roles['safe_tacos']
 
-            print(f"Sheet {sheet_name}: year_col={year_col}, time_col={time_col}, revenue_col={revenue_col}")
+            logger.debug("Sheet %s: year_col=%s, time_col=%s, revenue_col=%s", sheet_name, year_col, time_col, revenue_col)
 
             if not year_col or not revenue_col or not time_col:
-                print(f"Sheet {sheet_name}: Thiếu cột quan trọng, bỏ qua biểu đồ")
-                return
+                logger.debug("Sheet %s: Thiếu cột quan trọng, bỏ qua biểu đồ", sheet_name)
+                return placements
 
             def _get_display_name():
                 name = product_name
@@ -452,7 +630,7 @@ class ExcelProcessor:
             # Lấy danh sách năm
             years = [str(y) for y in sorted(df[year_col].dropna().unique())]
             if not years:
-                return
+                return placements
 
             # Tính toán vị trí chèn biểu đồ
             max_data_col = len(df.columns)
@@ -460,10 +638,21 @@ class ExcelProcessor:
             start_chart_col = get_column_letter(start_chart_col_idx)
             second_chart_col = get_column_letter(start_chart_col_idx + 10)
 
+            # Vị trí cột trong sheet (1-based) cho biểu đồ Excel gốc
+            columns = list(df.columns)
+            def _sheet_col(col):
+                return columns.index(col) + 1
+
             for i, year in enumerate(years):
-                year_df = df[df[year_col].astype(str) == year].copy()
+                year_mask = df[year_col].astype(str) == year
+                year_df = df[year_mask].copy()
                 if year_df.empty:
                     continue
+                
+                # Vùng dòng của năm trong sheet (dòng 1 là header)
+                year_positions = np.flatnonzero(year_mask.to_numpy())
+                first_row = int(year_positions[0]) + 2
+                last_row = int(year_positions[-1]) + 2
 
                 # Lọc và sắp xếp dữ liệu
                 # Loại bỏ các dòng có doanh số = 0 hoặc NaN
@@ -486,295 +675,175 @@ class ExcelProcessor:
                 
                 # Nếu không còn dữ liệu sau khi lọc, bỏ qua
                 if year_df.empty:
-                    print(f"Không có dữ liệu hợp lệ cho năm {year}, bỏ qua biểu đồ")
+                    logger.debug("Không có dữ liệu hợp lệ cho năm %s, bỏ qua biểu đồ", year)
                     continue
                 
-                # Sắp xếp theo thời gian tăng dần (dựa trên cột thời gian)
-                # Tạo key sắp xếp từ cột thời gian
-                def create_sort_key(time_str):
-                    try:
-                        time_str = str(time_str).lower()
-                        if 'jan' in time_str: month = 1
-                        elif 'feb' in time_str: month = 2
-                        elif 'mar' in time_str: month = 3
-                        elif 'apr' in time_str: month = 4
-                        elif 'may' in time_str: month = 5
-                        elif 'jun' in time_str: month = 6
-                        elif 'jul' in time_str: month = 7
-                        elif 'aug' in time_str: month = 8
-                        elif 'sep' in time_str: month = 9
-                        elif 'oct' in time_str: month = 10
-                        elif 'nov' in time_str: month = 11
-                        elif 'dec' in time_str: month = 12
-                        else: month = 0
-                        
-                        # Tìm số ngày
-                        import re
-                        day_match = re.search(r'(\d+)', time_str)
-                        day = int(day_match.group(1)) if day_match else 1  # Mặc định ngày 1 nếu không tìm thấy
-                        
-                        return (month, day)
-                    except:
-                        return (0, 0)
-                
-                year_df['sort_key'] = year_df[time_col].apply(create_sort_key)
-                year_df = year_df.sort_values('sort_key')
+                # Sắp xếp theo thời gian tăng dần (khóa tháng/ngày từ cột thời gian)
+                year_df = year_df.iloc[period_order(year_df[time_col])]
 
                 # ========== Biểu đồ 1: Doanh số + Chi phí quảng cáo ==========
-                plt.style.use('default')
-                fig, ax1 = plt.subplots(figsize=(14, 8))  # Tăng kích thước từ 12x6 lên 14x8
-                
                 # Dữ liệu cho biểu đồ - rút gọn nhãn thời gian chỉ hiển thị ngày/tháng
-                time_labels_raw = year_df[time_col].astype(str).tolist()
-                time_labels = []
-                month_day_counter = {}  # Đếm ngày cho mỗi tháng
-                
-                for label in time_labels_raw:
-                    if 'nan' in label or 'None' in label or label.strip() == '':
-                        time_labels.append('')
-                    else:
-                        import re
-                        # Mapping tháng
-                        month_map = {
-                            'jan': '1', 'feb': '2', 'mar': '3', 'apr': '4',
-                            'may': '5', 'jun': '6', 'jul': '7', 'aug': '8', 
-                            'sep': '9', 'oct': '10', 'nov': '11', 'dec': '12'
-                        }
-                        
-                        label_lower = label.lower()
-                        day = ''
-                        month = ''
-                        
-                        # Tìm tháng
-                        for month_name, month_num in month_map.items():
-                            if month_name in label_lower:
-                                month = month_num
-                                break
-                        
-                        # Tìm ngày (số đầu tiên trong chuỗi, bỏ qua nan)
-                        day_match = re.search(r'(\d+)', label)
-                        if day_match and 'nan' not in label_lower:
-                            day = day_match.group(1)
-                        else:
-                            # Nếu không có ngày cụ thể hoặc có "nan", tự động tăng ngày cho tháng này
-                            if month:
-                                if month not in month_day_counter:
-                                    month_day_counter[month] = 1
-                                else:
-                                    month_day_counter[month] += 1
-                                day = str(month_day_counter[month])
-                            else:
-                                day = '1'
-                        
-                        if month:
-                            time_labels.append(f'{day}/{month}')
-                        else:
-                            time_labels.append(label)
-                
-                revenue_data = year_df['revenue_numeric'].fillna(0).tolist()
-                
-                # Cột doanh số
-                bars = ax1.bar(time_labels, revenue_data, color='#1F4E78', alpha=0.8, label='Tổng doanh số')
-                
-                # Định dạng trục Y trái (doanh số)
-                ax1.set_ylabel('Tổng doanh số ($)', fontweight='bold')
-                ax1.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x:,.0f}'))
-                
-                # Thiết lập 5 mốc cho trục Y
-                if max(revenue_data) > 0:
-                    max_val = max(revenue_data)
-                    import math
-                    max_rounded = math.ceil(max_val / 500) * 500
-                    ax1.set_ylim(0, max_rounded)
-                    ax1.set_yticks([i * max_rounded / 4 for i in range(5)])
-                
-                ax1.grid(True, alpha=0.3)
-                
-                # Đường chi phí quảng cáo (nếu có)
+                time_labels = chart_labels(year_df[time_col])
+                
+                revenue_spec = {
+                    'kind': 'revenue',
+                    'figsize': (14, 8),  # Tăng kích thước từ 12x6 lên 14x8
+                    'title': f'{display_name} {year}',
+                    'labels': time_labels,
+                    'revenue': year_df['revenue_numeric'].fillna(0).tolist(),
+                    'ad_cost': None
+                }
                 if ad_cost_col and 'ad_cost_numeric' in year_df.columns:
-                    ax2 = ax1.twinx()
-                    ad_cost_data = year_df['ad_cost_numeric'].fillna(0).tolist()
-                    line = ax2.plot(time_labels, ad_cost_data, color='#C00000', linewidth=3, marker='o', label='Chi phí quảng cáo')
-                    ax2.set_ylabel('Chi phí quảng cáo ($)', fontweight='bold')
-                    ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'${x:,.0f}'))
-                    
-                    # Kết hợp chú thích của cả 2 trục
-                    lines1, labels1 = ax1.get_legend_handles_labels()
-                    lines2, labels2 = ax2.get_legend_handles_labels()
-                    ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left', frameon=True, fancybox=True, shadow=True)
-                else:
-                    # Chỉ có chú thích doanh số
-                    ax1.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
-                
-                # Tiêu đề và định dạng
-                plt.title(f'{display_name} {year}', fontsize=16, fontweight='bold', color='#C00000')
-                
-                # Xoay nhãn trục X và điều chỉnh khoảng cách - hiển thị tất cả nhãn
-                plt.xticks(range(len(time_labels)), time_labels, rotation=45, ha='right', fontsize=9)
-                
-                # Đảm bảo khoảng cách giữa các nhãn
-                ax1.tick_params(axis='x', which='major', pad=5)
-                
-                plt.tight_layout()
-                
-                # Lưu biểu đồ doanh số
-                img_buffer1 = io.BytesIO()
-                plt.savefig(img_buffer1, format='png', dpi=300, bbox_inches='tight')
-                plt.close(fig)  # Đóng figure để giải phóng bộ nhớ
-                img_buffer1.seek(0)
-                
-                # Chèn vào Excel
-                img1 = Image(img_buffer1)
-                img1.width = 560  # Tăng từ 480 pixels
-                img1.height = 336  # Tăng từ 288 pixels
-                ws.add_image(img1, f'{start_chart_col}{2 + i * 20}')
-                
-                plt.close()
+                    revenue_spec['ad_cost'] = year_df['ad_cost_numeric'].fillna(0).tolist()
+                
+                revenue_source = {
+                    'categories': (_sheet_col(time_col), first_row, last_row),
+                    'bars': [(_sheet_col(revenue_col), first_row, last_row, 'Tổng doanh số')],
+                    'lines': [],
+                    'secondary': True
+                }
+                if ad_cost_col:
+                    revenue_source['lines'].append((_sheet_col(ad_cost_col), first_row, last_row, 'Chi phí quảng cáo'))
+                
+                placements.append({
+                    'sheet': sheet_name,
+                    'year': year,
+                    'anchor': f'{start_chart_col}{2 + i * 20}',
+                    'width': 560,  # Tăng từ 480 pixels
+                    'height': 336,  # Tăng từ 288 pixels
+                    'spec': revenue_spec,
+                    'source': revenue_source
+                })
 
                 # ========== Biểu đồ 2: TACOS ==========
                 if tacos_col:
-                    fig, ax = plt.subplots(figsize=(14, 8))  # Tăng kích thước
+                    # Dữ liệu TACOS (chuyển sang tỉ lệ, vd "8.81%" -> 0.0881)
+                    tacos_data = tacos_fractions(year_df[tacos_col])
+                    # Biểu đồ native tham chiếu cột tỉ lệ đã chuẩn hóa nếu có
+                    tacos_source_col = TACOS_CHART_COLUMN if TACOS_CHART_COLUMN in columns else tacos_col
                     
-                    # Dữ liệu TACOS
-                    tacos_data = year_df[tacos_col].astype(str).str.rstrip('%').astype(float, errors='ignore')
-                    tacos_data = pd.to_numeric(tacos_data, errors='coerce').fillna(0)
-                    
-                    # Chuyển sang decimal nếu dữ liệu > 1 (nghĩa là đang ở dạng %)
-                    if tacos_data.max() > 1:
-                        tacos_data = tacos_data / 100
-                    
-                    # Cột TACOS
-                    bars = ax.bar(time_labels, tacos_data, color='#1F4E78', alpha=0.8, label='TACOS')
-                    
-                    # Đường TACOS an toàn 30%
-                    if safe_tacos_col:
-                        safe_data = [0.30] * len(time_labels)
-                        line = ax.plot(time_labels, safe_data, color='#C00000', linewidth=3, label='TACOS an toàn (30%)', linestyle='--')
-                    
-                    # Định dạng trục Y
-                    ax.set_ylabel('TACOS (%)', fontweight='bold')
-                    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x:.0%}'))
-                    ax.set_ylim(0, max(0.6, tacos_data.max() * 1.1))
-                    ax.set_yticks([i * 0.1 for i in range(7)])  # 0%, 10%, 20%, ..., 60%
-                    ax.grid(True, alpha=0.3)
-                    
-                    # Tiêu đề và chú thích
-                    plt.title(f'TACOS {year}', fontsize=16, fontweight='bold', color='#C00000')
-                    
-                    # Xoay nhãn và điều chỉnh hiển thị - hiển thị tất cả nhãn
-                    plt.xticks(range(len(time_labels)), time_labels, rotation=45, ha='right', fontsize=9)
-                    ax.tick_params(axis='x', which='major', pad=5)
-                    
-                    # Chú thích
-                    ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
-                    plt.tight_layout()
-                    
-                    # Lưu biểu đồ TACOS
-                    img_buffer2 = io.BytesIO()
-                    plt.savefig(img_buffer2, format='png', dpi=300, bbox_inches='tight')
-                    plt.close(fig)  # Đóng figure để giải phóng bộ nhớ
-                    img_buffer2.seek(0)
-                    
-                    # Chèn vào Excel
-                    img2 = Image(img_buffer2)
-                    img2.width = 560  # Tăng kích thước
-                    img2.height = 336
-                    ws.add_image(img2, f'{second_chart_col}{2 + i * 20}')
-                    
-                    plt.close()  # Đóng tất cả figures còn lại
+                    placements.append({
+                        'sheet': sheet_name,
+                        'year': year,
+                        'anchor': f'{second_chart_col}{2 + i * 20}',
+                        'width': 560,
+                        'height': 336,
+                        'spec': {
+                            'kind': 'tacos',
+                            'figsize': (14, 8),
+                            'title': f'TACOS {year}',
+                            'labels': time_labels,
+                            'tacos': tacos_data.tolist(),
+                            'safe_line': bool(safe_tacos_col)
+                        },
+                        'source': {
+                            'categories': (_sheet_col(time_col), first_row, last_row),
+                            'bars': [(_sheet_col(tacos_source_col), first_row, last_row, 'TACOS')],
+                            'lines': [(_sheet_col(safe_tacos_col), first_row, last_row, 'TACOS an toàn (30%)')]
+                            if safe_tacos_col else []
+                        }
+                    })
 
-                print(f"Đã thêm biểu đồ matplotlib {year} vào {start_chart_col}{2 + i * 20} và {second_chart_col}{2 + i * 20}")
+                logger.debug("Đã tạo spec biểu đồ %s cho %s%d và %s%d", year, start_chart_col, 2 + i * 20, second_chart_col, 2 + i * 20)
 
         except Exception as e:
-            print(f"Lỗi tạo biểu đồ matplotlib: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Lỗi tạo spec biểu đồ: %s", e)
+        
+        return placements
     
-    def _add_comparison_chart(self, workbook, sheet_name, df):
-        """Tạo biểu đồ so sánh giữa 2024 và 2025"""
+    def _add_comparison_chart(self, sheet_name, df, periods):
+        """Tính bảng tổng hợp theo năm và spec biểu đồ so sánh giữa các năm
+
+        Trả về {'rows': bảng tổng hợp, 'start_row': dòng bắt đầu, 'chart': vị trí chèn biểu đồ};
+        bảng được writer ghi bên dưới dữ liệu chính (năm mới nhất ở trên cùng).
+        """
         try:
-            ws = workbook[sheet_name]
+            # Năm mới nhất trước
+            years = list(reversed(periods))
             
-            # Tính tổng các chỉ số cho 2024 và 2025
-            total_quantity_2024 = df['Số lượng 2024'].sum()
-            total_revenue_2024 = df['Doanh số 2024'].sum()
-            total_ad_spent_2024 = df['Ad spent 2024'].sum()
+            # Tính tổng các chỉ số cho từng năm
+            total_quantities = [df[f'Số lượng {year}'].sum() for year in years]
+            total_revenues = [df[f'Doanh số {year}'].sum() for year in years]
+            total_ad_spents = [df[f'Ad spent {year}'].sum() for year in years]
             
-            total_quantity_2025 = df['Số lượng 2025'].sum()
-            total_revenue_2025 = df['Doanh số 2025'].sum()
-            total_ad_spent_2025 = df['Ad spent 2025'].sum()
+            # Tạo bảng tổng hợp (kèm TACOS tổng)
+            summary_data = [['Năm', 'Số lượng bán ra', 'Tổng doanh số', 'Tổng Ad spent', 'Tacos']]
+            for year, quantity, revenue, ad_spent in zip(years, total_quantities, total_revenues, total_ad_spents):
+                tacos = (ad_spent / revenue * 100) if revenue > 0 else 0
+                summary_data.append([year, quantity, revenue, ad_spent, f"{tacos:.2f}%"])
             
-            # Tính TACOS tổng
-            tacos_2024 = (total_ad_spent_2024 / total_revenue_2024 * 100) if total_revenue_2024 > 0 else 0
-            tacos_2025 = (total_ad_spent_2025 / total_revenue_2025 * 100) if total_revenue_2025 > 0 else 0
-            
-            # Tạo bảng tổng hợp
-            summary_data = [
-                ['Năm', 'Số lượng bán ra', 'Tổng doanh số', 'Tổng Ad spent', 'Tacos'],
-                ['2025', total_quantity_2025, total_revenue_2025, total_ad_spent_2025, f"{tacos_2025:.2f}%"],
-                ['2024', total_quantity_2024, total_revenue_2024, total_ad_spent_2024, f"{tacos_2024:.2f}%"]
-            ]
-            
-            # Chèn bảng vào Excel (bắt đầu từ cột sau dữ liệu chính)
+            # Bảng nằm dưới dữ liệu chính
             start_row = len(df) + 5
-            for i, row in enumerate(summary_data):
-                for j, value in enumerate(row):
-                    cell = ws.cell(row=start_row + i, column=j + 1, value=value)
-                    if i == 0:  # Header
-                        cell.font = Font(bold=True)
-                        cell.fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-                        cell.font = Font(bold=True, color='FFFFFF')
-            
-            # Tạo biểu đồ so sánh
-            plt.style.use('default')
-            fig, ax = plt.subplots(figsize=(12, 8))
             
-            # Dữ liệu cho biểu đồ
-            years = ['2025', '2024']
-            quantities = [total_quantity_2025, total_quantity_2024]
-            revenues = [total_revenue_2025, total_revenue_2024]
-            ad_spents = [total_ad_spent_2025, total_ad_spent_2024]
-            
-            x = range(len(years))
-            width = 0.25
-            
-            # Tạo các cột
-            bars1 = ax.bar([i - width for i in x], quantities, width, label='Số lượng bán ra', color='#1F4E78', alpha=0.8)
-            bars2 = ax.bar(x, revenues, width, label='Tổng doanh số', color='#C00000', alpha=0.8)
-            bars3 = ax.bar([i + width for i in x], ad_spents, width, label='Tổng Ad spent', color='#FFC000', alpha=0.8)
-            
-            # Định dạng biểu đồ
-            ax.set_xlabel('Năm', fontweight='bold')
-            ax.set_ylabel('Giá trị', fontweight='bold')
-            ax.set_title('Số lượng bán ra and Tổng doanh số', fontsize=14, fontweight='bold')
-            ax.set_xticks(x)
-            ax.set_xticklabels(years)
-            ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1))
-            ax.grid(True, alpha=0.3)
+            chart = {
+                'sheet': sheet_name,
+                'anchor': f'A{start_row + len(summary_data) + 2}',
+                'width': 600,
+                'height': 400,
+                'spec': {
+                    'kind': 'comparison',
+                    'figsize': (12, 8),
+                    'years': years,
+                    'quantities': total_quantities,
+                    'revenues': total_revenues,
+                    'ad_spents': total_ad_spents
+                },
+                'source': {
+                    'categories': (1, start_row + 1, start_row + len(summary_data) - 1),
+                    'bars': [
+                        (j + 1, start_row + 1, start_row + len(summary_data) - 1, summary_data[0][j])
+                        for j in range(1, 4)
+                    ]
+                }
+            }
             
-            # Định dạng trục Y với dấu phẩy
-            ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{x:,.0f}'))
+            return {'rows': summary_data, 'start_row': start_row, 'chart': chart}
             
-            plt.tight_layout()
+        except Exception as e:
+            logger.exception("Lỗi tạo biểu đồ so sánh: %s", e)
+            return None
+    
+    def _insert_charts(self, workbook, placements, chart_dir):
+        """Vẽ tất cả biểu đồ (song song nếu được cấu hình) rồi chèn ảnh vào workbook
+
+        Ảnh được ghi thành file PNG trong chart_dir (phải còn tới khi lưu workbook),
+        nên bộ nhớ không tăng theo số biểu đồ.
+
+        Với chart_mode='native', tạo biểu đồ Excel gốc tham chiếu dữ liệu trong sheet
+        thay vì vẽ ảnh.
+        """
+        try:
+            if self.chart_mode == 'native':
+                for done, placement in enumerate(placements, 1):
+                    add_native_chart(workbook[placement['sheet']], placement)
+                    self._report_progress('charts', done, len(placements))
+                self.chart_stats = {'charts': len(placements), 'mode': 'native'}
+                CHARTS.inc(len(placements), mode='native', source='rendered')
+                logger.info("Đã thêm %d biểu đồ Excel gốc", len(placements))
+                return
             
-            # Lưu biểu đồ
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            plt.close(fig)
-            img_buffer.seek(0)
+            # dpi/nén theo hồ sơ độ phân giải và kích thước hiển thị trong Excel
+            for placement in placements:
+                spec = placement['spec']
+                spec.update(render_settings(self.chart_profile, spec['figsize'], placement['width']))
             
-            # Chèn vào Excel
-            img = Image(img_buffer)
-            img.width = 600
-            img.height = 400
-            ws.add_image(img, f'A{start_row + len(summary_data) + 2}')
+            renderer = ChartRenderer(
+                max_workers=self.chart_workers,
+                cache=self.chart_cache,
+                progress_callback=lambda done, total: self._report_progress('charts', done, total)
+            )
+            images = renderer.render_to_files([placement['spec'] for placement in placements], chart_dir)
+            self.chart_stats = dict(renderer.stats, mode='image', profile=self.chart_profile)
+            CHARTS.inc(renderer.cache_hits, mode='image', source='cache')
+            CHARTS.inc(len(images) - renderer.cache_hits, mode='image', source='rendered')
             
-            print(f"Đã thêm biểu đồ so sánh vào sheet {sheet_name}")
+            for placement, png_path in zip(placements, images):
+                img = Image(png_path)
+                img.width = placement['width']
+                img.height = placement['height']
+                workbook[placement['sheet']].add_image(img, placement['anchor'])
             
+            logger.info("Đã chèn %d biểu đồ vào file Excel (%d lấy từ cache)", len(images), renderer.cache_hits)
+        
         except Exception as e:
-            print(f"Lỗi tạo biểu đồ so sánh: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
-
-
+            logger.exception("Lỗi vẽ biểu đồ: %s", e)
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import JOBS
+
+logger = logging.getLogger(__name__)
+
+
+def _boot_id():
+    """Id của lần khởi động máy (Linux), chuỗi rỗng nếu hệ điều hành không có"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def _pid_alive(pid):
+    """Process pid còn chạy hay không (trên cùng máy)"""
+    if os.name == 'nt':
+        # os.kill trên Windows kết thúc process nên phải hỏi qua WinAPI
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Hàng đợi job chạy nền (thread pool cục bộ, không cần broker).
+
+    Trạng thái job được lưu trong bảng SQLite nên vẫn tra cứu được sau khi
+    server khởi động lại. Mỗi job ghi kèm process sở hữu (`<boot id>:<pid>`);
+    khi khởi tạo, chỉ các job dở dang của process đã dừng mới bị đánh dấu lỗi,
+    nên nhiều worker (vd gunicorn) dùng chung một file SQLite không làm hỏng
+    job của nhau khi một worker khởi động lại.
+    Số job chạy đồng thời của process bị giới hạn bởi max_concurrent, các job
+    còn lại chờ (giới hạn theo từng process, không phải toàn server).
+
+    Tiến độ chỉ được ghi xuống SQLite khi đổi giai đoạn, khi giai đoạn xong hoặc
+    tối đa mỗi progress_interval giây, không phải mỗi lần báo (mỗi SKU/biểu đồ).
+    """
+
+    def __init__(self, db_path, max_concurrent=2, progress_interval=1.0):
+        self.db_path = db_path
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self.owner = f'{_boot_id()}:{os.getpid()}'
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='job')
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._lock, self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    done INTEGER,
+                    total INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT
+                )
+            ''')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'owner' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+
+            rows = conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            orphaned = [job_id for job_id, owner in rows if not self._owner_alive(owner)]
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                [('Job bị gián đoạn do server khởi động lại', now, job_id) for job_id in orphaned]
+            )
+
+    def _owner_alive(self, owner):
+        """Process sở hữu job (`<boot id>:<pid>`) còn chạy hay không
+
+        Job không có owner (tạo bởi phiên bản cũ) hoặc thuộc lần khởi động máy
+        trước được coi là đã dừng. Cùng pid với process hiện tại nghĩa là pid
+        được dùng lại sau khi process cũ dừng.
+        """
+        boot_id, _, pid = (owner or '').rpartition(':')
+        if not pid.isdigit() or boot_id != self.owner.rpartition(':')[0]:
+            return False
+        return int(pid) != os.getpid() and _pid_alive(int(pid))
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def submit(self, func, *args):
+        """Đưa job vào hàng đợi, trả về job id ngay lập tức
+
+        func(progress, *args) chạy ở thread nền; progress(stage, done=None, total=None)
+        dùng để báo tiến độ (progress.job_id là id của job), giá trị trả về (JSON
+        được) là kết quả của job.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, stage, created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', 'queued', now, now, self.owner)
+            )
+        self._executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status='running')
+
+        last = {'stage': None, 'time': 0.0}
+
+        def progress(stage, done=None, total=None):
+            now = time.monotonic()
+            if stage == last['stage'] and done != total and now - last['time'] < self.progress_interval:
+                return
+            last.update(stage=stage, time=now)
+            self._update(job_id, stage=stage, done=done, total=total)
+
+        progress.job_id = job_id
+
+        try:
+            result = func(progress, *args)
+            self._update(job_id, status='done', stage='done', result=json.dumps(result, default=str))
+            JOBS.inc(status='done')
+        except Exception as e:
+            logger.exception("Job %s lỗi", job_id)
+            self._update(job_id, status='failed', error=str(e))
+            JOBS.inc(status='failed')
+
+    def get(self, job_id):
+        """Trạng thái job dưới dạng dict, None nếu không tồn tại"""
+        with self._lock, self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'progress': {'done': row['done'], 'total': row['total']},
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from schema import SchemaResolver
+from sku_store import SKU_COLUMN, YEAR_COLUMN, LAYOUT_COLUMN
+
+
+# Chỉ số -> vai trò cột (xem schema.ROLE_KEYWORDS)
+_METRICS = {
+    'quantity': 'quantity',
+    'revenue': 'revenue',
+    'ad_spent': 'ad_cost',
+}
+
+
+def tacos_category(tacos_percent):
+    """Phân loại theo TACOS (%) cho cả mảng: <= 30 Tốt, <= 50 Xấu, còn lại TB"""
+    tacos_percent = np.asarray(tacos_percent, dtype=float)
+    return np.select(
+        [tacos_percent <= 30, tacos_percent <= 50],
+        ['Tốt', 'Xấu'],
+        default='TB'  # Trung bình
+    )
+
+
+def tacos_fractions(values):
+    """TACOS dạng tỉ lệ (0.25 = 25%) từ một cột TACOS của sheet
+
+    Ô có thể là chuỗi "8.81%" hoặc số; giá trị không đọc được là 0. Nếu có giá
+    trị > 1 thì cả cột được coi là đang tính theo % và chia cho 100.
+    """
+    fractions = pd.to_numeric(pd.Series(values).astype(str).str.rstrip('%'), errors='coerce').fillna(0)
+    if len(fractions) and fractions.max() > 1:
+        fractions = fractions / 100
+    return fractions
+
+
+def sku_kpis(store, schema=None):
+    """Tổng số lượng, doanh số, ad spent, TACOS và phân loại của mọi SKU/năm
+
+    store: SkuDataStore, schema: SchemaResolver dùng để nhận diện cột.
+    Trả về DataFrame một dòng cho mỗi (SKU, năm) theo thứ tự SKU rồi năm, gồm
+    các cột sku, year, quantity, revenue, ad_spent, tacos (%) và category.
+    SKU không có dữ liệu trong năm có các chỉ số bằng 0.
+
+    Cột chỉ số được xác định một lần cho mỗi tổ hợp layout sheet (thường chỉ có
+    một), giống như trên DataFrame của từng SKU; phần cộng dồn được thực hiện
+    bằng một groupby trên toàn bộ bảng.
+    """
+    if schema is None:
+        schema = SchemaResolver()
+    table = store.table
+    index = pd.MultiIndex.from_product([store.skus, store.periods], names=['sku', 'year'])
+
+    if len(table):
+        group_keys = [table[SKU_COLUMN], table[YEAR_COLUMN]]
+
+        # Tổ hợp layout của từng nhóm (SKU, năm) -> cột của DataFrame dựng lại cho nhóm đó
+        group_ids = table.groupby(group_keys, observed=True, sort=False).ngroup().to_numpy()
+        layouts = table[[SKU_COLUMN, YEAR_COLUMN, LAYOUT_COLUMN]].drop_duplicates()
+        signatures = layouts.groupby([SKU_COLUMN, YEAR_COLUMN], observed=True, sort=False)[LAYOUT_COLUMN].agg(tuple)
+        signature_codes, signature_values = pd.factorize(signatures)
+        row_signatures = signature_codes[group_ids]
+
+        numeric_columns = {}
+        values = {metric: np.zeros(len(table)) for metric in _METRICS}
+        for code, signature in enumerate(signature_values):
+            roles = schema.resolve(store.view_columns(signature))
+            rows = row_signatures == code
+            for metric, role in _METRICS.items():
+                col = roles[role]
+                if col is None:
+                    continue
+                if col not in numeric_columns:
+                    numeric_columns[col] = pd.to_numeric(table[col], errors='coerce').fillna(0).to_numpy(dtype=float)
+                values[metric][rows] = numeric_columns[col][rows]
+
+        totals = pd.DataFrame(values).groupby(group_keys, observed=True).sum()
+        totals.index.names = ['sku', 'year']
+        kpis = totals.reindex(index, fill_value=0)
+    else:
+        kpis = pd.DataFrame(0.0, index=index, columns=list(_METRICS))
+
+    revenue = kpis['revenue'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tacos = np.where(revenue > 0, kpis['ad_spent'].to_numpy() / revenue * 100, 0.0)
+
+    kpis['tacos'] = tacos
+    kpis['category'] = tacos_category(tacos)
+    return kpis.reset_index()
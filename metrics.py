@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+
+# Ngưỡng (giây) của histogram thời gian mỗi giai đoạn xử lý
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_value(value):
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name}: cần đúng các nhãn {self.labels}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng (vd số file đã đọc), theo từng tổ hợp nhãn"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        # Bộ đếm không nhãn được xuất ngay từ đầu với giá trị 0
+        if not self.labels:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}']
+
+
+class Histogram(_Metric):
+    """Phân bố giá trị (vd thời gian mỗi giai đoạn) theo các ngưỡng cố định"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Số lần rơi vào từng ngưỡng (phần tử cuối: vượt ngưỡng lớn nhất) và tổng giá trị
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = (('le', _format_value(bound)),)
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Tập các chỉ số của process, xuất ra định dạng text của Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=STAGE_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+FILES_PROCESSED = REGISTRY.counter(
+    'report_files_total', 'Số file Excel đã xử lý (source: parsed = đọc file, cache = lấy từ cache trích xuất)', ['source'])
+ROWS_SCANNED = REGISTRY.counter(
+    'report_rows_scanned_total', 'Số dòng của các sheet năm đã quét để tìm SKU')
+SKUS_MATCHED = REGISTRY.counter(
+    'report_skus_matched_total', 'Số SKU có dữ liệu trong ít nhất một sheet năm')
+CHARTS = REGISTRY.counter(
+    'report_charts_total', 'Số biểu đồ đã tạo (mode: image/native/web, source: rendered/cache)', ['mode', 'source'])
+BYTES_WRITTEN = REGISTRY.counter(
+    'report_bytes_written_total', 'Dung lượng các file Excel output đã ghi (byte)')
+JOBS = REGISTRY.counter(
+    'report_jobs_total', 'Số job xử lý đã kết thúc theo trạng thái', ['status'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'report_stage_duration_seconds', 'Thời gian của từng giai đoạn xử lý (giây)', ['stage'])
+
+
+class StageTimer:
+    """Đo thời gian các giai đoạn nối tiếp nhau (bắt đầu giai đoạn mới = kết thúc giai đoạn cũ)
+
+    Thời gian được cộng dồn vào `seconds` theo tên giai đoạn và ghi vào
+    histogram STAGE_SECONDS khi giai đoạn kết thúc.
+    """
+
+    def __init__(self, histogram=STAGE_SECONDS):
+        self.histogram = histogram
+        self.seconds = {}
+        self.stage = None
+        self._started = None
+
+    def start(self, stage):
+        if stage == self.stage:
+            return
+        self.stop()
+        self.stage = stage
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self.stage is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        self.seconds[self.stage] = self.seconds.get(self.stage, 0.0) + elapsed
+        self.histogram.observe(elapsed, stage=self.stage)
+        self.stage = None
@@ -0,0 +1,85 @@
+from openpyxl.chart import BarChart, LineChart, Reference, Series
+
+
+# openpyxl đo kích thước chart bằng cm, kích thước hiển thị trong sheet tính bằng pixel
+PIXELS_PER_CM = 96 / 2.54
+
+# Tiêu đề và định dạng trục theo loại biểu đồ (giống bản vẽ matplotlib)
+_AXES = {
+    'revenue': {'y_title': 'Tổng doanh số ($)', 'y_format': '"$"#,##0',
+                'y2_title': 'Chi phí quảng cáo ($)', 'y2_format': '"$"#,##0'},
+    'tacos': {'y_title': 'TACOS (%)', 'y_format': '0%'},
+    'comparison': {'x_title': 'Năm', 'y_title': 'Giá trị', 'y_format': '#,##0'},
+}
+
+_BAR_COLORS = ['1F4E78', 'C00000', 'FFC000']
+_LINE_COLOR = 'C00000'
+
+
+def _series(ws, col, min_row, max_row, title):
+    values = Reference(ws, min_col=col, min_row=min_row, max_row=max_row)
+    return Series(values, title=title)
+
+
+def add_native_chart(ws, placement):
+    """Tạo biểu đồ Excel gốc (openpyxl.chart) tham chiếu trực tiếp vùng dữ liệu của sheet
+
+    placement['source'] mô tả vùng ô:
+        'categories': (cột, dòng đầu, dòng cuối) cho nhãn trục X
+        'bars':  [(cột, dòng đầu, dòng cuối, tên series), ...]
+        'lines': [(cột, dòng đầu, dòng cuối, tên series), ...]
+        'secondary': True nếu đường được vẽ trên trục Y phụ (bên phải)
+    """
+    spec = placement['spec']
+    source = placement['source']
+    axes = _AXES[spec['kind']]
+
+    chart = BarChart()
+    chart.type = 'col'
+    chart.title = spec.get('title', 'Số lượng bán ra and Tổng doanh số')
+    chart.y_axis.title = axes['y_title']
+    chart.y_axis.number_format = axes['y_format']
+    if 'x_title' in axes:
+        chart.x_axis.title = axes['x_title']
+
+    # openpyxl >= 3.1 mặc định ẩn trục
+    chart.x_axis.delete = False
+    chart.y_axis.delete = False
+
+    for i, (col, min_row, max_row, title) in enumerate(source['bars']):
+        series = _series(ws, col, min_row, max_row, title)
+        series.graphicalProperties.solidFill = _BAR_COLORS[i % len(_BAR_COLORS)]
+        chart.series.append(series)
+
+    categories = Reference(ws, min_col=source['categories'][0],
+                           min_row=source['categories'][1], max_row=source['categories'][2])
+    chart.set_categories(categories)
+
+    if source.get('lines'):
+        line = LineChart()
+        for col, min_row, max_row, title in source['lines']:
+            series = _series(ws, col, min_row, max_row, title)
+            series.graphicalProperties.line.solidFill = _LINE_COLOR
+            series.graphicalProperties.line.width = 28575  # 2.25pt
+            if spec['kind'] == 'tacos':
+                series.graphicalProperties.line.dashStyle = 'dash'
+            else:
+                series.marker.symbol = 'circle'
+            line.series.append(series)
+        line.set_categories(categories)
+
+        if source.get('secondary'):
+            # Trục Y phụ bên phải
+            line.y_axis.axId = 200
+            line.y_axis.crosses = 'max'
+            line.y_axis.title = axes.get('y2_title')
+            line.y_axis.number_format = axes.get('y2_format', 'General')
+            line.y_axis.delete = False
+
+        chart += line
+
+    chart.legend.position = 'tr' if spec['kind'] == 'comparison' else 't'
+    chart.width = placement['width'] / PIXELS_PER_CM
+    chart.height = placement['height'] / PIXELS_PER_CM
+
+    ws.add_chart(chart, placement['anchor'])
@@ -0,0 +1,106 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Tên tháng viết tắt -> số tháng (theo thứ tự ưu tiên khi nhãn chứa nhiều tên tháng)
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+_DIGITS = re.compile(r'(\d+)')
+_ORDINAL_SUFFIXES = ['st', 'nd', 'rd']
+
+
+def as_text(series):
+    """Giá trị dạng chuỗi như str(value) từng ô (NaN -> 'nan', None -> 'None')"""
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype.kind in 'mM':
+        return series.map(str).astype(object)
+
+    text = series.astype(str).astype(object)
+    missing = series.isna().to_numpy()
+    if missing.any():
+        text[missing] = [str(value) for value in series[missing]]
+    return text
+
+
+def build_time_labels(first, second):
+    """Ghép hai cột Unnamed (tháng, ngày) thành nhãn "Oct - 2nd", "Nov - 1st"...
+
+    - cả hai ô đều trống (nan): ''
+    - chỉ thiếu ngày ("Oct - nan"): đánh số tự động theo từng tháng
+      (1st, 2nd, 3rd, 4th...) theo thứ tự dòng
+    - còn lại: "<tháng> - <ngày>"
+    """
+    first = as_text(first).reset_index(drop=True)
+    second = as_text(second).reset_index(drop=True)
+
+    first_nan = first.str.contains('nan', regex=False).to_numpy()
+    second_nan = second.str.contains('nan', regex=False).to_numpy()
+    auto = second_nan & ~first_nan
+
+    labels = first + ' - ' + second
+    if auto.any():
+        months = first[auto]
+        counter = months.groupby(months.str.lower(), sort=False).cumcount() + 1
+        suffix = np.select([counter == n for n in (1, 2, 3)], _ORDINAL_SUFFIXES, default='th')
+        labels[auto] = months + ' - ' + counter.astype(str) + suffix
+    labels[first_nan & second_nan] = ''
+
+    return labels.replace(['nan - nan', 'None - None'], '').astype(str)
+
+
+def month_numbers(labels):
+    """Số tháng (1-12, 0 nếu không có) của từng nhãn chữ thường"""
+    return np.select(
+        [labels.str.contains(month, regex=False).to_numpy() for month in MONTHS],
+        np.arange(1, len(MONTHS) + 1),
+        default=0
+    )
+
+
+def period_keys(values):
+    """Khóa sắp xếp (tháng, ngày) của cột thời gian, dạng DataFrame 2 cột số nguyên
+
+    Ngày là số đầu tiên trong nhãn (mặc định 1).
+    """
+    text = as_text(pd.Series(values)).str.lower()
+    days = text.str.extract(_DIGITS, expand=False).fillna('1').astype(np.int64)
+    return pd.DataFrame({'month': month_numbers(text), 'day': days.to_numpy()})
+
+
+def period_order(values):
+    """Vị trí các dòng theo thứ tự thời gian tăng dần (ổn định với khóa trùng)"""
+    keys = period_keys(values)
+    return np.lexsort((keys['day'].to_numpy(), keys['month'].to_numpy()))
+
+
+def chart_labels(values):
+    """Nhãn trục biểu đồ dạng ngày/tháng ("2/10") cho cột thời gian đã sắp xếp
+
+    Nhãn trống hoặc có nan/None -> ''. Nhãn không có ngày (hoặc có nan) được
+    đánh số tự động theo từng tháng. Nhãn không nhận ra tháng được giữ nguyên.
+    """
+    labels = pd.Series(values).astype(str).fillna('').astype(object).reset_index(drop=True)
+    lower = labels.str.lower()
+
+    empty = (
+        labels.str.contains('nan', regex=False)
+        | labels.str.contains('None', regex=False)
+        | (labels.str.strip() == '')
+    ).to_numpy()
+    months = month_numbers(lower)
+    has_month = (months > 0) & ~empty
+
+    days = labels.str.extract(_DIGITS, expand=False).astype(object)
+    auto = (days.isna() | lower.str.contains('nan', regex=False)).to_numpy()
+    days[auto] = '1'
+
+    counted = auto & has_month
+    if counted.any():
+        counter = pd.Series(months[counted]).groupby(months[counted], sort=False).cumcount() + 1
+        days[counted] = counter.astype(str).to_numpy()
+
+    result = labels.copy()
+    result[has_month] = days[has_month] + '/' + pd.Series(months, dtype=str)[has_month]
+    result[empty] = ''
+    return result.tolist()
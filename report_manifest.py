@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Tăng khi thay đổi nội dung sheet SKU/biểu đồ để buộc tạo lại toàn bộ
+MANIFEST_VERSION = '3'
+
+
+def frame_fingerprint(df):
+    """Hash của một DataFrame: tên cột, kiểu dữ liệu và toàn bộ giá trị"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns], ensure_ascii=False).encode('utf-8'))
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode('utf-8'))
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def sku_fingerprint(sku_data, product_name, years):
+    """Hash dữ liệu đầu vào của một sheet SKU (tên sản phẩm + dữ liệu các năm)"""
+    digest = hashlib.sha256()
+    digest.update(str(product_name).encode('utf-8'))
+    for year in years:
+        digest.update(b'\0')
+        digest.update(year.encode('utf-8'))
+        digest.update(frame_fingerprint(sku_data[year]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def manifest_path(output_path):
+    """File manifest nằm cạnh file output: `<tên file>.manifest.json`"""
+    return os.path.splitext(output_path)[0] + '.manifest.json'
+
+
+def load_manifest(output_path):
+    """Đọc manifest của một lần chạy trước, None nếu không có hoặc không dùng được"""
+    try:
+        with open(manifest_path(output_path), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(output_path, settings, sheets):
+    """Ghi manifest: thiết lập tạo báo cáo + {sku: {'sheet', 'fingerprint'}}"""
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'settings': settings,
+        'skus': sheets
+    }
+    with open(manifest_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,184 @@
+import functools
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Tăng khi thay đổi cấu trúc file để bỏ qua các file cũ
+RESULTS_VERSION = '1'
+
+NUMERIC_FIELDS = ['quantity', 'revenue', 'ad_spent', 'tacos']
+SORT_FIELDS = ['sku', 'product_name'] + NUMERIC_FIELDS + ['category']
+
+
+def results_path(output_path):
+    """File kết quả KPI nằm cạnh file output: `<tên file>.results.pkl`"""
+    return os.path.splitext(output_path)[0] + '.results.pkl'
+
+
+def save_results(output_path, kpis, product_names):
+    """Ghi bảng KPI (sku_kpis) của một lần xử lý kèm tên sản phẩm của từng SKU"""
+    table = kpis.copy()
+    table['product_name'] = [product_names.get(sku) for sku in table['sku']]
+    table['sku'] = table['sku'].astype(str)
+    with open(results_path(output_path), 'wb') as f:
+        pickle.dump({'version': RESULTS_VERSION, 'kpis': table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_results(output_path):
+    """RunResults của một báo cáo, None nếu không có hoặc không dùng được
+
+    Kết quả (cùng các chỉ mục) được cache trong bộ nhớ theo thời điểm sửa file.
+    """
+    path = results_path(output_path)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _read_results(path, modified)
+
+
+@functools.lru_cache(maxsize=4)
+def _read_results(path, modified):
+    try:
+        with open(path, 'rb') as f:
+            stored = pickle.load(f)
+    except Exception:
+        return None
+
+    if stored.get('version') != RESULTS_VERSION:
+        return None
+    return RunResults(stored['kpis'])
+
+
+def _product_name(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+
+class RunResults:
+    """KPI theo SKU/năm của một lần xử lý, kèm chỉ mục dựng sẵn cho truy vấn
+
+    Mỗi năm có các cột dạng mảng numpy (mỗi SKU một dòng) và thứ tự sắp xếp
+    tăng/giảm (ổn định) của từng trường, tính một lần khi nạp. Truy vấn chỉ lọc
+    bằng mặt nạ trên thứ tự đã sắp xếp rồi cắt trang, nên không phải sắp xếp lại
+    dù có hàng chục nghìn SKU.
+    """
+
+    def __init__(self, kpis):
+        self.years = [str(year) for year in sorted(kpis['year'].unique())]
+        self.skus = list(dict.fromkeys(kpis['sku']))
+        self._years = {}
+
+        for year, rows in kpis.groupby('year', sort=True):
+            rows = rows.reset_index(drop=True)
+            columns = {
+                'sku': rows['sku'].to_numpy(dtype=object),
+                'product_name': np.array([_product_name(name) for name in rows['product_name']], dtype=object),
+                'category': rows['category'].to_numpy(dtype=object),
+            }
+            for field in NUMERIC_FIELDS:
+                columns[field] = rows[field].to_numpy(dtype=float)
+
+            search = pd.Series(columns['sku']).str.lower() + '\0' + pd.Series(columns['product_name']).fillna('').str.lower()
+
+            orders = {}
+            for field in SORT_FIELDS:
+                values = columns[field]
+                if values.dtype == object:
+                    values = pd.Series(values).fillna('').str.lower()
+                rank = pd.Series(values).rank(method='dense').to_numpy()
+                orders[field, False] = np.argsort(rank, kind='stable')
+                orders[field, True] = np.argsort(-rank, kind='stable')
+
+            self._years[str(year)] = {
+                'columns': columns,
+                'orders': orders,
+                'search': search.to_numpy(dtype=object),
+                'positions': {sku: position for position, sku in enumerate(columns['sku'])},
+            }
+
+    def summary(self):
+        """Số SKU và tổng chỉ số, số SKU theo phân loại TACOS của từng năm"""
+        years = {}
+        for year, data in self._years.items():
+            columns = data['columns']
+            revenue = columns['revenue'].sum()
+            ad_spent = columns['ad_spent'].sum()
+            categories, counts = np.unique(columns['category'], return_counts=True)
+            years[year] = {
+                'quantity': float(columns['quantity'].sum()),
+                'revenue': float(revenue),
+                'ad_spent': float(ad_spent),
+                'tacos': float(ad_spent / revenue * 100) if revenue > 0 else 0.0,
+                'categories': {str(category): int(count) for category, count in zip(categories, counts)},
+            }
+        return {'skus': len(self.skus), 'years': self.years, 'totals': years}
+
+    def query(self, year=None, sort='revenue', descending=True, page=1, per_page=50,
+              categories=None, ranges=None, search=None):
+        """Một trang SKU của năm `year` (mặc định năm mới nhất), đã lọc và sắp xếp
+
+        ranges: {trường số: (min, max)} (None = không giới hạn), categories: list
+        phân loại TACOS, search: chuỗi con của mã SKU hoặc tên sản phẩm.
+        """
+        if year is None:
+            year = self.years[-1] if self.years else None
+        if year not in self._years:
+            raise ValueError(f'Năm không hợp lệ: {year}')
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'Trường sắp xếp không hợp lệ: {sort}')
+
+        data = self._years[year]
+        columns = data['columns']
+        order = data['orders'][sort, descending]
+
+        mask = None
+        for field, (low, high) in (ranges or {}).items():
+            if low is not None:
+                mask = _and(mask, columns[field] >= low)
+            if high is not None:
+                mask = _and(mask, columns[field] <= high)
+        if categories:
+            mask = _and(mask, np.isin(columns['category'], categories))
+        if search:
+            mask = _and(mask, pd.Series(data['search']).str.contains(search.lower(), regex=False).to_numpy())
+
+        positions = order if mask is None else order[mask[order]]
+        start = (page - 1) * per_page
+        return {
+            'year': year,
+            'total': len(positions),
+            'page': page,
+            'per_page': per_page,
+            'pages': -(-len(positions) // per_page),
+            'items': [self._item(year, position) for position in positions[start:start + per_page]],
+        }
+
+    def sku(self, sku):
+        """Chỉ số của một SKU theo từng năm, None nếu không có"""
+        years = {}
+        for year, data in self._years.items():
+            position = data['positions'].get(sku)
+            if position is not None:
+                years[year] = self._item(year, position)
+        return years or None
+
+    def _item(self, year, position):
+        columns = self._years[year]['columns']
+        return {
+            'sku': columns['sku'][position],
+            'product_name': columns['product_name'][position],
+            'year': year,
+            'quantity': int(columns['quantity'][position]),
+            'revenue': float(columns['revenue'][position]),
+            'ad_spent': float(columns['ad_spent'][position]),
+            'tacos': float(columns['tacos'][position]),
+            'category': columns['category'][position],
+        }
+
+
+def _and(mask, condition):
+    return condition if mask is None else mask & condition
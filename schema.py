@@ -0,0 +1,89 @@
+import json
+import threading
+
+
+# Từ khóa nhận diện cột theo vai trò (so khớp chuỗi con, không phân biệt hoa thường;
+# lấy cột đầu tiên theo thứ tự cột có chứa một trong các từ khóa).
+# Biểu đồ dùng danh sách doanh số / chi phí quảng cáo hẹp hơn bảng tổng hợp nên
+# được giữ thành vai trò riêng.
+ROLE_KEYWORDS = {
+    'year': ['năm', 'year'],
+    'time': ['thời gian', 'time', 'ngày', 'date', 'tuần', 'week'],
+    'quantity': ['số lượng bán ra', 'quantity', 'units sold', 'sold'],
+    'revenue': ['doanh số', 'revenue', 'tổng doanh', 'sales'],
+    'ad_cost': ['chi phí quảng cáo', 'ad cost', 'advertising', 'quảng cáo', 'ad spent'],
+    'chart_revenue': ['tổng doanh số', 'doanh số', 'revenue', 'sales'],
+    'chart_ad_cost': ['chi phí quảng cáo', 'ad cost', 'advertising', 'quảng cáo'],
+    'tacos': ['tacos'],
+    'safe_tacos': ['tacos an toàn', 'tacos an toan', 'safe tacos'],
+}
+
+# Override của vai trò gốc cũng áp dụng cho vai trò tương ứng của biểu đồ
+_BASE_ROLES = {
+    'chart_revenue': 'revenue',
+    'chart_ad_cost': 'ad_cost',
+}
+
+
+def find_column(columns, keywords):
+    """Cột đầu tiên có tên chứa một trong các từ khóa (không phân biệt hoa thường)"""
+    for col in columns:
+        col_lower = str(col).lower()
+        if any(keyword in col_lower for keyword in keywords):
+            return col
+    return None
+
+
+class SchemaResolver:
+    """Xác định vai trò của các cột (số lượng, doanh số, chi phí QC, TACOS, thời gian, năm)
+
+    Kết quả được cache theo tuple header, nên mỗi bố cục sheet chỉ phải dò
+    từ khóa một lần dù có hàng nghìn SKU.
+
+    overrides: {vai trò: [tên header, ...]} do người dùng chỉ định (so khớp
+    nguyên tên, không phân biệt hoa thường), được ưu tiên trước từ khóa.
+    """
+
+    def __init__(self, overrides=None):
+        self.overrides = {
+            role: [str(name).strip().lower() for name in ([names] if isinstance(names, str) else names)]
+            for role, names in (overrides or {}).items()
+        }
+        unknown = set(self.overrides) - set(ROLE_KEYWORDS)
+        if unknown:
+            raise ValueError(f"Vai trò cột không hợp lệ: {', '.join(sorted(unknown))}")
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """Đọc override từ file JSON {vai trò: tên header hoặc list tên header}"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def cache_token(self):
+        """Chuỗi mô tả các override (dùng để so thiết lập giữa các lần chạy)"""
+        return json.dumps(self.overrides, sort_keys=True, ensure_ascii=False)
+
+    def resolve(self, columns):
+        """{vai trò: tên cột hoặc None} cho một bộ header"""
+        key = tuple(columns)
+        roles = self._cache.get(key)
+        if roles is None:
+            roles = {role: self._resolve_role(key, role) for role in ROLE_KEYWORDS}
+            with self._lock:
+                self._cache[key] = roles
+        return roles
+
+    def column(self, columns, role):
+        """Tên cột đảm nhận vai trò role, None nếu không có"""
+        return self.resolve(columns)[role]
+
+    def _resolve_role(self, columns, role):
+        names = self.overrides.get(role) or self.overrides.get(_BASE_ROLES.get(role), [])
+        for name in names:
+            for col in columns:
+                if str(col).strip().lower() == name:
+                    return col
+        return find_column(columns, ROLE_KEYWORDS[role])
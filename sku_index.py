@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+
+class SkuRowIndex:
+    """Chỉ mục tìm các dòng chứa SKU trong một sheet năm.
+
+    Sheet chỉ được chuyển sang chuỗi một lần: mỗi giá trị ô khác nhau được
+    `str()` + `lower()` đúng một lần, sau đó tất cả SKU được dò cùng lúc trên
+    tập giá trị duy nhất này. Ngữ nghĩa giữ nguyên như trước: SKU xuất hiện
+    ở bất kỳ ô nào của dòng (chuỗi con, không phân biệt hoa thường).
+    """
+
+    def __init__(self, df):
+        self.df = df
+        n_rows, n_cols = df.shape
+
+        # Trải phẳng sheet theo thứ tự dòng, mỗi ô nhớ lại số thứ tự dòng của nó
+        values = df.to_numpy(dtype=object).ravel()
+        row_ids = np.repeat(np.arange(n_rows), n_cols)
+
+        # Ô rỗng (NaN/None) không bao giờ chứa SKU
+        codes, uniques = pd.factorize(values)
+        has_value = codes >= 0
+        self._codes = codes[has_value]
+        self._rows = row_ids[has_value]
+        self._texts = [str(value).lower() for value in uniques]
+
+    def match(self, skus):
+        """Trả về dict {sku: mảng vị trí dòng (tăng dần)} cho các SKU có xuất hiện"""
+        # Gom SKU theo khóa chữ thường (nhiều SKU có thể trùng khóa, vd 'B01' và 'b01')
+        patterns = {}
+        for sku_id, sku in enumerate(skus):
+            patterns.setdefault(str(sku).lower(), []).append(sku_id)
+
+        if not patterns or len(self._codes) == 0:
+            return {}
+
+        lengths = sorted({len(key) for key in patterns})
+
+        # Dò tất cả SKU trên từng giá trị ô duy nhất bằng cửa sổ trượt theo độ dài SKU
+        pair_codes = []
+        pair_skus = []
+        for code, text in enumerate(self._texts):
+            found = set()
+            text_len = len(text)
+            for length in lengths:
+                if length > text_len:
+                    break
+                for start in range(text_len - length + 1):
+                    sku_ids = patterns.get(text[start:start + length])
+                    if sku_ids:
+                        found.update(sku_ids)
+            for sku_id in found:
+                pair_codes.append(code)
+                pair_skus.append(sku_id)
+
+        if not pair_codes:
+            return {}
+
+        # Nối (giá trị ô -> SKU) với (ô -> dòng) để ra (SKU -> dòng)
+        cell_mask = np.isin(self._codes, pair_codes)
+        cells = pd.DataFrame({'code': self._codes[cell_mask], 'row': self._rows[cell_mask]})
+        pairs = pd.DataFrame({'code': pair_codes, 'sku_id': pair_skus})
+        hits = cells.merge(pairs, on='code')[['sku_id', 'row']].drop_duplicates()
+        hits = hits.sort_values(['sku_id', 'row'], kind='stable')
+
+        skus = list(skus)
+        return {
+            skus[sku_id]: group['row'].to_numpy()
+            for sku_id, group in hits.groupby('sku_id', sort=False)
+        }
+
+    def rows(self, positions):
+        """Lấy các dòng theo vị trí, giữ nguyên index gốc của sheet"""
+        return self.df.take(positions)
+
+
+class PerformanceIndex:
+    """Chỉ mục sheet Performance: vai trò cột được xác định một lần cho mỗi file,
+    sau đó tên sản phẩm và thông tin của SKU được tra cứu trực tiếp qua dict.
+
+    Có thể nạp nhiều sheet (mỗi file một sheet); file sau ghi đè thông tin của
+    file trước giống như khi xử lý tuần tự.
+    """
+
+    SKU_KEYWORDS = ['sku', 'asin', 'sản phẩm', 'mã']
+    PRODUCT_KEYWORDS = ['sản phẩm', 'product']
+
+    def __init__(self):
+        self._records = {}
+        self._product_names = {}
+
+    @classmethod
+    def find_sku_column(cls, sheet):
+        """Tìm cột chứa mã sản phẩm/SKU/ASIN"""
+        for col in sheet.columns:
+            col_lower = str(col).lower()
+            if any(keyword in col_lower for keyword in cls.SKU_KEYWORDS):
+                return col
+
+        # Lấy cột thứ 2 (thường là ASIN)
+        return sheet.columns[1] if len(sheet.columns) > 1 else sheet.columns[0]
+
+    @classmethod
+    def find_product_column(cls, sheet):
+        """Tìm cột chứa tên sản phẩm"""
+        for col in sheet.columns:
+            col_lower = str(col).lower()
+            if any(keyword in col_lower for keyword in cls.PRODUCT_KEYWORDS):
+                return col
+        return None
+
+    def add_sheet(self, sheet):
+        """Nạp một sheet Performance, trả về danh sách SKU của sheet (theo thứ tự xuất hiện)"""
+        sku_column = self.find_sku_column(sheet)
+        product_column = self.find_product_column(sheet)
+
+        # Mỗi SKU chỉ lấy dòng đầu tiên
+        first_rows = sheet[sheet[sku_column].notna()].drop_duplicates(subset=sku_column, keep='first')
+        skus = first_rows[sku_column].tolist()
+
+        self._records.update(zip(skus, first_rows.to_dict('records')))
+        if product_column is not None:
+            self._product_names.update(zip(skus, first_rows[product_column].tolist()))
+
+        return skus
+
+    def update(self, other):
+        """Gộp một chỉ mục khác vào (thông tin của other ghi đè)"""
+        self._records.update(other._records)
+        self._product_names.update(other._product_names)
+
+    def product_name(self, sku, default=None):
+        """Tên sản phẩm của SKU (default nếu không có cột sản phẩm)"""
+        return self._product_names.get(sku, default)
+
+    def metadata(self, sku):
+        """Toàn bộ thông tin dòng Performance của SKU dưới dạng dict"""
+        return self._records.get(sku, {})
+
+    @property
+    def skus(self):
+        return list(self._records)
+
+    def __contains__(self, sku):
+        return sku in self._records
+
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,167 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+# Cột nội bộ của bảng dài (tên khó trùng với header trong file Excel)
+SKU_COLUMN = '__sku__'
+YEAR_COLUMN = '__year__'
+LAYOUT_COLUMN = '__layout__'
+
+
+class SkuDataStore(Mapping):
+    """Bảng dữ liệu dạng dài chứa dòng của mọi SKU, mọi năm (thay cho dict các DataFrame nhỏ)
+
+    Mỗi dòng của các sheet năm khớp với một SKU xuất hiện một lần trong `table`,
+    kèm cột SKU và năm kiểu categorical. Bảng được nối một lần duy nhất từ các
+    file, không concat dần từng SKU. Chỉ mục (SKU, năm) -> vị trí dòng được tính
+    một lần bằng groupby.
+
+    Các sheet khác nhau có thể có cột khác nhau, nên mỗi dòng nhớ layout (cột và
+    kiểu dữ liệu) của sheet gốc. Nhờ đó frame(sku, năm) dựng lại đúng DataFrame
+    như cách concat từng file trước đây.
+
+    Store dùng được như dict {sku: {'product_name': ..., năm: DataFrame}}: các
+    view theo SKU được tạo khi truy cập.
+    """
+
+    def __init__(self, table, layouts, product_names):
+        self.table = table
+        self.product_names = product_names
+        self.periods = list(table[YEAR_COLUMN].cat.categories)
+
+        # SKU có dữ liệu, theo thứ tự xuất hiện đầu tiên
+        codes = np.unique(table[SKU_COLUMN].cat.codes.to_numpy())
+        self.skus = table[SKU_COLUMN].cat.categories.take(codes[codes >= 0]).tolist()
+
+        self._positions = table.groupby([SKU_COLUMN, YEAR_COLUMN], observed=True, sort=False).indices
+        self._layout_codes = table[LAYOUT_COLUMN].to_numpy()
+
+        # Với mỗi layout: vị trí cột trong bảng dài và các cột cần đổi lại kiểu dữ liệu gốc
+        self._layout_columns = [columns for columns, _ in layouts]
+        self._layouts = []
+        for columns, dtypes in layouts:
+            casts = {col: dtype for col, dtype in dtypes.items() if table[col].dtype != dtype}
+            self._layouts.append((table.columns.get_indexer(columns), casts))
+
+    @classmethod
+    def from_extracted(cls, extracted_files, performance_index):
+        """Dựng store từ kết quả extract_file của các file (theo thứ tự file)"""
+        sku_order = {}
+        frames = []
+        layouts = []
+        periods = set()
+
+        for extracted in extracted_files:
+            for sku in extracted['skus']:
+                sku_order.setdefault(sku, None)
+
+            for year, piece in extracted['pieces'].items():
+                rows = piece['rows'].reset_index(drop=True)
+                layouts.append((list(rows.columns), rows.dtypes.to_dict()))
+                rows[SKU_COLUMN] = piece['skus']
+                rows[YEAR_COLUMN] = year
+                rows[LAYOUT_COLUMN] = len(layouts) - 1
+                frames.append(rows)
+                periods.add(year)
+
+        product_names = {sku: performance_index.product_name(sku) for sku in sku_order}
+        return cls._build(frames, layouts, sku_order, periods, product_names)
+
+    @classmethod
+    def from_frames(cls, data):
+        """Dựng store từ dict {sku: {'product_name': ..., năm: DataFrame}}"""
+        frames = []
+        layouts = []
+        periods = set()
+
+        for sku, sku_data in data.items():
+            for year, df in sku_data.items():
+                if year == 'product_name':
+                    continue
+                periods.add(year)
+                if df.empty:
+                    continue
+                rows = df.reset_index(drop=True)
+                layouts.append((list(rows.columns), rows.dtypes.to_dict()))
+                rows[SKU_COLUMN] = [sku] * len(rows)
+                rows[YEAR_COLUMN] = year
+                rows[LAYOUT_COLUMN] = len(layouts) - 1
+                frames.append(rows)
+
+        return cls._build(frames, layouts, list(data), periods,
+                          {sku: sku_data.get('product_name') for sku, sku_data in data.items()})
+
+    @classmethod
+    def _build(cls, frames, layouts, sku_order, periods, product_names):
+        if frames:
+            table = pd.concat(frames, ignore_index=True)
+        else:
+            table = pd.DataFrame({SKU_COLUMN: [], YEAR_COLUMN: [], LAYOUT_COLUMN: np.array([], dtype=np.int64)})
+
+        table[SKU_COLUMN] = pd.Categorical(table[SKU_COLUMN], categories=list(sku_order))
+        table[YEAR_COLUMN] = pd.Categorical(table[YEAR_COLUMN], categories=sorted(periods), ordered=True)
+        return cls(table, layouts, product_names)
+
+    def view_columns(self, layout_ids):
+        """Cột của DataFrame ghép từ các layout (theo thứ tự, như pd.concat)"""
+        columns = {}
+        for layout_id in layout_ids:
+            columns.update(dict.fromkeys(self._layout_columns[layout_id]))
+        return list(columns)
+
+    def frame(self, sku, year):
+        """DataFrame các dòng của SKU trong năm (cột và kiểu dữ liệu như sheet gốc)"""
+        positions = self._positions.get((sku, year))
+        if positions is None:
+            return pd.DataFrame()
+
+        # Các đoạn dòng liên tiếp đến từ cùng một sheet được lấy một lượt
+        layout_ids = self._layout_codes[positions]
+        breaks = np.flatnonzero(np.diff(layout_ids)) + 1
+
+        pieces = []
+        for run in np.split(positions, breaks):
+            column_positions, casts = self._layouts[self._layout_codes[run[0]]]
+            piece = self.table.iloc[run, column_positions]
+            if casts:
+                piece = piece.astype(casts)
+            pieces.append(piece)
+
+        if len(pieces) == 1:
+            return pieces[0].reset_index(drop=True)
+        return pd.concat(pieces, ignore_index=True)
+
+    def __getitem__(self, sku):
+        if (sku in self.product_names) and any((sku, year) in self._positions for year in self.periods):
+            return SkuView(self, sku)
+        raise KeyError(sku)
+
+    def __iter__(self):
+        return iter(self.skus)
+
+    def __len__(self):
+        return len(self.skus)
+
+
+class SkuView(Mapping):
+    """Dữ liệu của một SKU: {'product_name': ..., năm: DataFrame}"""
+
+    def __init__(self, store, sku):
+        self.store = store
+        self.sku = sku
+
+    def __getitem__(self, key):
+        if key == 'product_name':
+            return self.store.product_names.get(self.sku)
+        if key in self.store.periods:
+            return self.store.frame(self.sku, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield 'product_name'
+        yield from self.store.periods
+
+    def __len__(self):
+        return 1 + len(self.store.periods)
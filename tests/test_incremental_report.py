@@ -0,0 +1,90 @@
+import openpyxl
+import pandas as pd
+import pytest
+
+from excel_processor import ExcelProcessor
+from report_manifest import load_manifest, sku_fingerprint
+from schema import SchemaResolver
+from sku_store import SkuDataStore
+
+
+def _frame(revenue):
+    return pd.DataFrame({
+        'Thời gian': ['Jan - 1st', 'Feb - 1st'],
+        'Số lượng bán ra': [1, 2],
+        'Tổng doanh số': revenue,
+        'Chi phí quảng cáo': [10.0, 20.0],
+        'Tacos': ['10.00%', '20.00%'],
+    })
+
+
+def _data(**revenues):
+    return {sku: {'product_name': f'Sản phẩm {sku}', '2025': _frame(revenue)} for sku, revenue in revenues.items()}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # create_output_excel ghi vào thư mục outputs/ của thư mục hiện tại
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'outputs').mkdir()
+    return tmp_path
+
+
+def _report(data, previous=None, **options):
+    processor = ExcelProcessor([], chart_mode='native', **options)
+    output = processor.create_output_excel(SkuDataStore.from_frames(data), previous_output=previous)
+    assert output is not None
+    return f'outputs/{output}', processor.incremental_stats
+
+
+def test_fingerprint_changes_only_with_sku_data():
+    store = SkuDataStore.from_frames(_data(A=[100.0, 200.0], B=[300.0, 400.0]))
+    changed = SkuDataStore.from_frames(_data(A=[100.0, 250.0], B=[300.0, 400.0]))
+    years = ['2025']
+
+    assert sku_fingerprint(store['A'], 'x', years) != sku_fingerprint(changed['A'], 'x', years)
+    assert sku_fingerprint(store['B'], 'x', years) == sku_fingerprint(changed['B'], 'x', years)
+    assert sku_fingerprint(store['B'], 'x', years) != sku_fingerprint(store['B'], 'y', years)
+
+
+def test_only_changed_sku_is_rebuilt(workdir):
+    first, _ = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0], C=[500.0, 600.0]))
+    second, stats = _report(_data(A=[100.0, 200.0], B=[300.0, 999.0], C=[500.0, 600.0]), previous=first)
+
+    assert stats == {'incremental': True, 'rebuilt': 1, 'reused': 2}
+    assert load_manifest(second)['skus']['B'] != load_manifest(first)['skus']['B']
+    assert openpyxl.load_workbook(second)['Sản phẩm B']['D3'].value == 999.0
+
+
+def test_removed_sku_sheet_is_dropped(workdir):
+    first, _ = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0], C=[500.0, 600.0]))
+    second, stats = _report(_data(A=[100.0, 200.0], C=[500.0, 600.0]), previous=first)
+
+    assert stats == {'incremental': True, 'rebuilt': 0, 'reused': 2}
+    assert set(load_manifest(second)['skus']) == {'A', 'C'}
+    assert openpyxl.load_workbook(second).sheetnames == ['TỔNG PERFORMANCE', 'Sản phẩm A', 'Sản phẩm C']
+
+
+def test_added_sku_sheet_keeps_data_order(workdir):
+    first, _ = _report(_data(A=[100.0, 200.0], C=[500.0, 600.0]))
+    second, stats = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0], C=[500.0, 600.0]), previous=first)
+
+    assert stats == {'incremental': True, 'rebuilt': 1, 'reused': 2}
+    assert openpyxl.load_workbook(second).sheetnames == ['TỔNG PERFORMANCE', 'Sản phẩm A', 'Sản phẩm B', 'Sản phẩm C']
+
+
+def test_changed_settings_rebuild_everything(workdir):
+    first, _ = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0]))
+    _, stats = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0]), previous=first, chart_profile='draft')
+
+    assert stats == {'incremental': False, 'rebuilt': 2, 'reused': 0}
+
+
+def test_changed_schema_overrides_rebuild_everything(workdir):
+    first, _ = _report(_data(A=[100.0, 200.0], B=[300.0, 400.0]))
+    _, stats = _report(
+        _data(A=[100.0, 200.0], B=[300.0, 400.0]), previous=first,
+        schema=SchemaResolver({'chart_revenue': 'Tổng doanh số'})
+    )
+
+    assert stats == {'incremental': False, 'rebuilt': 2, 'reused': 0}
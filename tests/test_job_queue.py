@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from job_queue import JobQueue, _boot_id
+
+
+def _wait(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} chưa xong')
+
+
+def _insert(db_path, job_id, owner):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            'INSERT INTO jobs (id, status, stage, created_at, updated_at, owner) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, 'running', 'parsing', 0, 0, owner)
+        )
+
+
+def test_job_records_owner_and_result(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    job_id = queue.submit(lambda progress, x: {'job': progress.job_id, 'x': x}, 3)
+
+    job = _wait(queue, job_id)
+    assert job['status'] == 'done'
+    assert job['result'] == {'job': job_id, 'x': 3}
+    with sqlite3.connect(tmp_path / 'jobs.sqlite3') as conn:
+        owner, = conn.execute('SELECT owner FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    assert owner == f'{_boot_id()}:{os.getpid()}'
+
+
+def test_startup_only_fails_jobs_of_stopped_processes(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    JobQueue(db_path)
+
+    # pid của một process đã kết thúc
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    dead_pid = int(finished.stdout)
+    _insert(db_path, 'alive', f'{_boot_id()}:{os.getppid()}')
+    _insert(db_path, 'dead', f'{_boot_id()}:{dead_pid}')
+    _insert(db_path, 'rebooted', f'other-boot:{os.getppid()}')
+    _insert(db_path, 'legacy', None)
+
+    queue = JobQueue(db_path)
+    assert queue.get('alive')['status'] == 'running'
+    for job_id in ('dead', 'rebooted', 'legacy'):
+        assert queue.get(job_id)['status'] == 'failed'
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpi import sku_kpis, tacos_category
+from sku_store import SkuDataStore
+
+
+def _year(quantity, revenue, ad_cost):
+    return pd.DataFrame({
+        'Thời gian': [f'Jan - {i + 1}st' for i in range(len(revenue))],
+        'Số lượng bán ra': quantity,
+        'Tổng doanh số': revenue,
+        'Chi phí quảng cáo': ad_cost,
+    })
+
+
+@pytest.mark.parametrize('tacos, category', [
+    (0.0, 'Tốt'),
+    (30.0, 'Tốt'),
+    (30.01, 'Xấu'),
+    (50.0, 'Xấu'),
+    (50.01, 'TB'),
+    (250.0, 'TB'),
+    (np.nan, 'TB'),
+])
+def test_tacos_category_boundaries(tacos, category):
+    assert tacos_category([tacos])[0] == category
+
+
+def test_sku_kpis_totals_and_categories():
+    store = SkuDataStore.from_frames({
+        'A': {'product_name': 'Áo', '2024': _year([1, 2], [100.0, 200.0], [30.0, 60.0])},     # 30% Tốt
+        'B': {'product_name': 'Bình', '2024': _year([5], [100.0], [50.0]),                    # 50% Xấu
+              '2025': _year([1], ['x'], [5.0])},                                              # doanh số 0
+        'C': {'product_name': 'Cáp', '2025': _year([2], [100.0], [50.5])},                    # 50.5% TB
+    })
+
+    kpis = sku_kpis(store).set_index(['sku', 'year'])
+
+    assert list(kpis.index) == [('A', '2024'), ('A', '2025'), ('B', '2024'), ('B', '2025'), ('C', '2024'), ('C', '2025')]
+    assert kpis.loc[('A', '2024'), ['quantity', 'revenue', 'ad_spent', 'tacos']].tolist() == [3.0, 300.0, 90.0, 30.0]
+    assert kpis['category'].to_dict() == {
+        ('A', '2024'): 'Tốt',
+        ('A', '2025'): 'Tốt',   # không có dữ liệu: các chỉ số bằng 0
+        ('B', '2024'): 'Xấu',
+        ('B', '2025'): 'Tốt',   # doanh số không đọc được -> 0, TACOS 0
+        ('C', '2024'): 'Tốt',
+        ('C', '2025'): 'TB',
+    }
+    assert kpis.loc[('A', '2025'), 'revenue'] == 0
@@ -0,0 +1,90 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from periods import build_time_labels, chart_labels, period_keys, period_order
+
+MONTH_NAMES = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+# Các vòng lặp theo từng dòng của bản cũ (_process_time_columns, _build_chart_specs)
+def _loop_time_labels(first, second):
+    labels = []
+    counter = {}
+    for first_val, second_val in zip(map(str, first), map(str, second)):
+        if 'nan' in first_val and 'nan' in second_val:
+            labels.append('')
+        elif 'nan' in second_val:
+            month = first_val.lower()
+            counter[month] = counter.get(month, 0) + 1
+            suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(counter[month], 'th')
+            labels.append(f'{first_val} - {counter[month]}{suffix}')
+        else:
+            labels.append(first_val + ' - ' + second_val)
+    return ['' if label in ('nan - nan', 'None - None') else label for label in labels]
+
+
+def _loop_sort_key(value):
+    text = str(value).lower()
+    month = next((i for i, name in enumerate(MONTH_NAMES, 1) if name in text), 0)
+    match = re.search(r'(\d+)', text)
+    return month, int(match.group(1)) if match else 1
+
+
+def _loop_chart_labels(values):
+    labels = []
+    counter = {}
+    for label in map(str, values):
+        if 'nan' in label or 'None' in label or label.strip() == '':
+            labels.append('')
+            continue
+        lower = label.lower()
+        month = next((str(i) for i, name in enumerate(MONTH_NAMES, 1) if name in lower), '')
+        match = re.search(r'(\d+)', label)
+        if match and 'nan' not in lower:
+            day = match.group(1)
+        elif month:
+            counter[month] = counter.get(month, 0) + 1
+            day = str(counter[month])
+        else:
+            day = '1'
+        labels.append(f'{day}/{month}' if month else label)
+    return labels
+
+
+# Sheet hai năm: nhãn tháng lặp lại ở năm sau, có ô thiếu ngày, ô trống và số
+MONTHS = pd.Series(['Dec', 'Dec', 'Jan', 'Jan', np.nan, 'Oct', 'Jan', 'Jan', 'Feb', 'JAN', None, 'Week 3'])
+DAYS = pd.Series(['2nd', np.nan, '1st', np.nan, np.nan, 15, np.nan, np.nan, '3rd', np.nan, None, np.nan])
+
+
+def test_time_labels_match_row_loop_across_years():
+    labels = build_time_labels(MONTHS, DAYS)
+
+    assert labels.tolist() == _loop_time_labels(MONTHS, DAYS)
+    # Đánh số tự động theo tháng tiếp tục qua năm sau, không phân biệt hoa thường
+    assert labels.tolist()[:4] == ['Dec - 2nd', 'Dec - 1st', 'Jan - 1st', 'Jan - 1st']
+    assert labels.tolist()[6:10] == ['Jan - 2nd', 'Jan - 3rd', 'Feb - 3rd', 'JAN - 4th']
+
+
+def test_time_labels_ignore_the_series_index():
+    labels = build_time_labels(MONTHS.set_axis(range(100, 112)), DAYS.set_axis(range(200, 212)))
+    assert labels.tolist() == _loop_time_labels(MONTHS, DAYS)
+
+
+@pytest.mark.parametrize('values', [
+    ['Oct - 2nd', 'Jan - 15th', 'Jan - 3rd', 'Dec - 1st', 'Feb - 28th'],
+    ['Dec - 2nd', 'Dec - 1st', 'Jan - 1st', 'Jan - 1st', '', 'Oct - 15', 'Week 3', None, 7],
+])
+def test_period_order_matches_stable_sort_of_row_keys(values):
+    keys = [_loop_sort_key(value) for value in values]
+
+    assert list(map(tuple, period_keys(values).to_numpy())) == keys
+    assert list(period_order(values)) == sorted(range(len(values)), key=keys.__getitem__)
+
+
+def test_chart_labels_match_row_loop():
+    values = build_time_labels(MONTHS, DAYS).tolist() + ['Mar', 'Mar', 'Week 3', 'nan', ' ', 'None - 2nd']
+    assert chart_labels(values) == _loop_chart_labels(values)
+    assert chart_labels(['Oct - 2nd', 'Mar', 'Mar']) == ['2/10', '1/3', '2/3']
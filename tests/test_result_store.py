@@ -0,0 +1,113 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from kpi import tacos_category
+from result_store import RESULTS_VERSION, load_results, results_path, save_results
+
+
+def _kpis(rows):
+    """Bảng KPI như sku_kpis từ list (sku, năm, số lượng, doanh số, ad spent)"""
+    kpis = pd.DataFrame(rows, columns=['sku', 'year', 'quantity', 'revenue', 'ad_spent'])
+    kpis['tacos'] = (kpis['ad_spent'] / kpis['revenue'] * 100).where(kpis['revenue'] > 0, 0.0)
+    kpis['category'] = tacos_category(kpis['tacos'])
+    return kpis
+
+
+@pytest.fixture
+def results(tmp_path):
+    rows = [
+        ('A1', '2024', 10, 1000.0, 100.0),   # TACOS 10% Tốt
+        ('B2', '2024', 20, 500.0, 200.0),    # 40% Xấu
+        ('C3', '2024', 30, 500.0, 300.0),    # 60% TB
+        ('D4', '2024', 40, 0.0, 0.0),        # 0% Tốt
+        ('E5', '2024', 50, 2000.0, 500.0),   # 25% Tốt
+        ('A1', '2025', 11, 1100.0, 550.0),
+        ('B2', '2025', 21, 700.0, 70.0),
+        ('C3', '2025', 31, 900.0, 90.0),
+        ('D4', '2025', 41, 100.0, 10.0),
+        ('E5', '2025', 51, 300.0, 30.0),
+    ]
+    output_path = str(tmp_path / 'report.xlsx')
+    save_results(output_path, _kpis(rows), {'A1': 'Áo khoác', 'B2': 'Bình nước', 'C3': None, 'D4': 'Dây sạc', 'E5': 'Áo mưa'})
+    return load_results(output_path)
+
+
+def _skus(page):
+    return [item['sku'] for item in page['items']]
+
+
+def test_defaults_to_latest_year_sorted_by_revenue_desc(results):
+    page = results.query()
+    assert page['year'] == '2025'
+    assert _skus(page) == ['A1', 'C3', 'B2', 'E5', 'D4']
+    assert page['total'] == 5 and page['pages'] == 1
+
+
+def test_paging_splits_and_keeps_order(results):
+    pages = [results.query(year='2024', sort='sku', descending=False, page=n, per_page=2) for n in (1, 2, 3)]
+    assert [_skus(page) for page in pages] == [['A1', 'B2'], ['C3', 'D4'], ['E5']]
+    assert all(page['total'] == 5 and page['pages'] == 3 for page in pages)
+
+
+def test_page_past_the_end_is_empty(results):
+    page = results.query(page=10, per_page=2)
+    assert page['items'] == []
+    assert page['total'] == 5
+
+
+def test_ties_keep_stable_order_in_both_directions(results):
+    # B2 và C3 cùng doanh số 500 năm 2024: giữ thứ tự gốc ở cả hai chiều
+    assert _skus(results.query(year='2024', sort='revenue', descending=False)) == ['D4', 'B2', 'C3', 'A1', 'E5']
+    assert _skus(results.query(year='2024', sort='revenue', descending=True)) == ['E5', 'A1', 'B2', 'C3', 'D4']
+
+
+def test_missing_product_names_sort_first_ascending(results):
+    assert _skus(results.query(sort='product_name', descending=False))[0] == 'C3'
+
+
+def test_range_filters_are_inclusive(results):
+    page = results.query(year='2024', ranges={'revenue': (500, 1000), 'tacos': (None, 40)})
+    assert _skus(page) == ['A1', 'B2']
+    assert page['total'] == 2
+
+
+def test_category_and_search_filters(results):
+    assert _skus(results.query(year='2024', categories=['Tốt'])) == ['E5', 'A1', 'D4']
+    assert _skus(results.query(year='2024', categories=['Tốt', 'TB'], search='áo')) == ['E5', 'A1']
+    # Tìm theo mã SKU, không phân biệt hoa thường
+    assert _skus(results.query(search='c3')) == ['C3']
+
+
+def test_filters_with_no_match(results):
+    page = results.query(ranges={'revenue': (10 ** 6, None)})
+    assert page == dict(page, total=0, pages=0, items=[])
+
+
+def test_invalid_year_or_sort_raises(results):
+    with pytest.raises(ValueError):
+        results.query(year='1999')
+    with pytest.raises(ValueError):
+        results.query(sort='price')
+
+
+def test_sku_lookup_and_summary(results):
+    years = results.sku('B2')
+    assert set(years) == {'2024', '2025'}
+    assert years['2024']['category'] == 'Xấu' and years['2024']['quantity'] == 20
+    assert results.sku('ZZ') is None
+
+    summary = results.summary()
+    assert summary['skus'] == 5 and summary['years'] == ['2024', '2025']
+    assert summary['totals']['2024']['revenue'] == 4000.0
+    assert summary['totals']['2024']['categories'] == {'TB': 1, 'Tốt': 3, 'Xấu': 1}
+
+
+def test_missing_or_outdated_file_is_ignored(tmp_path):
+    output_path = str(tmp_path / 'report.xlsx')
+    assert load_results(output_path) is None
+
+    with open(results_path(output_path), 'wb') as f:
+        pickle.dump({'version': RESULTS_VERSION + '-old', 'kpis': None}, f)
+    assert load_results(output_path) is None
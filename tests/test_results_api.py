@@ -0,0 +1,74 @@
+import os
+
+import pandas as pd
+import pytest
+
+from result_store import save_results
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # app tạo thư mục upload/output/cache trong thư mục hiện tại khi import
+    workdir = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+
+    output_folder = str(workdir / 'outputs')
+    app.app.config['OUTPUT_FOLDER'] = output_folder
+    kpis = pd.DataFrame({
+        'sku': [f'S{i:03d}' for i in range(120)],
+        'year': '2025',
+        'quantity': [float(i) for i in range(120)],
+        'revenue': [float(i * 10) for i in range(120)],
+        'ad_spent': [float(i) for i in range(120)],
+        'tacos': [10.0] * 120,
+        'category': ['Tốt'] * 120,
+    })
+    save_results(os.path.join(output_folder, 'run1.xlsx'), kpis, {})
+    return app.app.test_client()
+
+
+def test_lists_first_page_by_default(client):
+    body = client.get('/runs/run1/skus').get_json()
+    assert body['run'] == 'run1'
+    assert body['total'] == 120 and body['per_page'] == 50 and body['pages'] == 3
+    assert body['items'][0]['sku'] == 'S119'
+
+
+def test_query_parameters(client):
+    body = client.get('/runs/run1/skus?sort=sku&order=asc&page=2&per_page=10&min_revenue=100&max_revenue=300').get_json()
+    assert body['total'] == 21
+    assert [item['sku'] for item in body['items']] == [f'S{i:03d}' for i in range(20, 30)]
+
+
+def test_repeated_category_parameter(client):
+    assert client.get('/runs/run1/skus?category=Xấu&category=TB').get_json()['total'] == 0
+    assert client.get('/runs/run1/skus?category=Xấu&category=Tốt').get_json()['total'] == 120
+
+
+@pytest.mark.parametrize('query', [
+    'page=0', 'page=abc', 'per_page=0', 'per_page=501', 'order=up', 'sort=price',
+    'year=1999', 'min_tacos=x', 'max_ad_spent=1e',
+])
+def test_invalid_parameters_return_400(client, query):
+    response = client.get(f'/runs/run1/skus?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unknown_run_or_sku_returns_404(client):
+    assert client.get('/runs/nope/skus').status_code == 404
+    assert client.get('/runs/nope/results').status_code == 404
+    assert client.get('/runs/run1/skus/NOPE').status_code == 404
+
+
+def test_summary_and_single_sku(client):
+    summary = client.get('/runs/run1/results').get_json()
+    assert summary['skus'] == 120 and summary['years'] == ['2025']
+
+    body = client.get('/runs/run1/skus/S005').get_json()
+    assert body['years']['2025']['revenue'] == 50.0
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from sku_index import PerformanceIndex, SkuRowIndex
+
+
+def _sheet():
+    return pd.DataFrame({
+        'Thời gian': ['Jan - 1st', 'Jan - 1st', 'Feb - 1st', 'Feb - 1st', 'Mar - 1st'],
+        'Mã': ['B0ABC', 'sku a.1 (cũ)', 12345, None, 'AX1'],
+        'Doanh số': [100.0, 200.0, 300.0, 400.0, 500.0],
+    }, index=[10, 11, 12, 13, 14])
+
+
+def _match(skus):
+    return {sku: list(rows) for sku, rows in SkuRowIndex(_sheet()).match(skus).items()}
+
+
+def test_sku_is_matched_as_literal_substring_ignoring_case():
+    # '.' và '(' là ký tự thường, không phải regex: 'A.1' không khớp 'AX1'
+    assert _match(['A.1']) == {'A.1': [1]}
+    assert _match(['(cũ)']) == {'(cũ)': [1]}
+    assert _match(['b0abc', 'ABC']) == {'b0abc': [0], 'ABC': [0]}
+
+
+def test_numeric_sku_matches_numeric_cells():
+    assert _match([12345]) == {12345: [2]}
+    # Giá trị số của cột Doanh số được so theo str(): '300.0' chứa '300'
+    assert _match([300]) == {300: [2]}
+
+
+def test_sku_not_found_is_left_out():
+    assert _match(['ZZZ', 'B0ABC']) == {'B0ABC': [0]}
+    assert _match(['ZZZ']) == {}
+    assert _match([]) == {}
+
+
+def test_rows_are_returned_in_sheet_order_with_original_index():
+    index = SkuRowIndex(_sheet())
+    matches = index.match(['feb', 'JAN'])
+    assert list(matches) == ['feb', 'JAN']
+    assert list(matches['JAN']) == [0, 1]
+    assert list(index.rows(matches['feb']).index) == [12, 13]
+
+
+def test_empty_sheet_matches_nothing():
+    assert SkuRowIndex(pd.DataFrame({'Mã': [np.nan, None]})).match(['A']) == {}
+
+
+def test_performance_index_keeps_first_row_per_sku():
+    sheet = pd.DataFrame({
+        'ASIN': ['A1', 'B2', 'A1', None],
+        'Tên sản phẩm': ['Áo', 'Bình', 'Áo mới', 'Không mã'],
+    })
+    index = PerformanceIndex()
+
+    assert index.add_sheet(sheet) == ['A1', 'B2']
+    assert index.product_name('A1') == 'Áo'
+    assert 'B2' in index and len(index) == 2
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from sku_index import PerformanceIndex
+from sku_store import SkuDataStore
+
+
+def _frames():
+    return {
+        'A': {
+            'product_name': 'Áo',
+            '2024': pd.DataFrame({'Thời gian': ['Jan - 1st'], 'Số lượng bán ra': [3], 'Tacos': ['10.00%']}),
+            '2025': pd.DataFrame({'Thời gian': ['Jan - 1st', 'Feb - 1st'], 'Tổng doanh số': [1.5, 2.5]}),
+        },
+        'B': {
+            'product_name': None,
+            '2024': pd.DataFrame({'Thời gian': ['Mar - 1st'], 'Số lượng bán ra': [7], 'Ghi chú': [None]}),
+            '2025': pd.DataFrame(),
+        },
+    }
+
+
+def test_frame_returns_the_rows_that_went_in():
+    data = _frames()
+    store = SkuDataStore.from_frames(data)
+
+    # Cột và kiểu dữ liệu như frame gốc dù bảng dài chứa cột của mọi layout
+    for sku in ('A', 'B'):
+        assert_frame_equal(store.frame(sku, '2024'), data[sku]['2024'])
+    assert_frame_equal(store.frame('A', '2025'), data['A']['2025'])
+    assert store.frame('A', '2025')['Tổng doanh số'].dtype == np.float64
+    assert store.frame('B', '2024')['Số lượng bán ra'].dtype == np.int64
+
+
+def test_missing_sku_year_gives_empty_frame():
+    store = SkuDataStore.from_frames(_frames())
+    assert store.frame('B', '2025').empty
+    assert store.frame('Z', '2024').empty
+
+
+def test_store_behaves_like_the_old_dict():
+    store = SkuDataStore.from_frames(_frames())
+
+    assert list(store) == ['A', 'B'] and len(store) == 2
+    assert store.periods == ['2024', '2025']
+    assert list(store['A']) == ['product_name', '2024', '2025']
+    assert store['A']['product_name'] == 'Áo'
+    with pytest.raises(KeyError):
+        store['Z']
+
+
+def test_rows_of_one_sku_from_several_files_are_concatenated_in_file_order():
+    first = pd.DataFrame({'Thời gian': ['Jan - 1st'], 'Số lượng bán ra': [1]})
+    second = pd.DataFrame({'Thời gian': ['Feb - 1st'], 'Tổng doanh số': [9.0]})
+    extracted = [
+        {'skus': ['A'], 'pieces': {'2025': {'rows': first, 'skus': np.array(['A'], dtype=object)}}},
+        {'skus': ['A', 'C'], 'pieces': {'2025': {'rows': second, 'skus': np.array(['A'], dtype=object)}}},
+    ]
+    performance_index = PerformanceIndex()
+    performance_index.add_sheet(pd.DataFrame({'ASIN': ['A'], 'Sản phẩm': ['Áo']}))
+
+    store = SkuDataStore.from_extracted(extracted, performance_index)
+
+    assert list(store) == ['A']
+    assert store['A']['product_name'] == 'Áo'
+    assert_frame_equal(store.frame('A', '2025'), pd.concat([first, second], ignore_index=True))
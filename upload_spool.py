@@ -0,0 +1,77 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app
+
+
+class SpooledUpload:
+    """File upload được ghi thẳng xuống thư mục upload theo từng chunk.
+
+    Werkzeug đọc body của request theo từng chunk và gọi write() ngay khi nhận
+    được, nên dữ liệu không bao giờ nằm trọn trong bộ nhớ; sha256 được tính
+    trong lúc ghi (không cần đọc lại file). Tốc độ đọc request phụ thuộc tốc
+    độ ghi đĩa, client gửi nhanh hơn sẽ phải chờ.
+
+    Sau khi request được parse, gọi finalize() để đổi tên file tạm thành file
+    chính thức; file tạm chưa finalize sẽ bị xóa khi close().
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self._finalized = False
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read/seek/readline/... dùng trực tiếp của file tạm
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def finalize(self, filename):
+        """Đổi tên file tạm thành `<sha256[:16]>_<filename>`, trả về đường dẫn mới
+
+        Tên file chứa hash nội dung nên các file cùng tên nhưng khác nội dung
+        không ghi đè lên nhau. Nếu đã có file cùng nội dung (upload trước đó,
+        có thể khác tên) thì bỏ file tạm và dùng lại file cũ.
+        """
+        self._file.close()
+        prefix = self.sha256[:16]
+        existing = glob.glob(os.path.join(glob.escape(self.directory), f'{prefix}_*'))
+        if existing:
+            os.remove(self.temp_path)
+            path = existing[0]
+        else:
+            path = os.path.join(self.directory, f'{prefix}_{filename}')
+            os.replace(self.temp_path, path)
+        self._finalized = True
+        return path
+
+    def close(self):
+        self._file.close()
+        if not self._finalized:
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+
+
+class SpoolingRequest(Request):
+    """Request ghi file upload thẳng vào UPLOAD_FOLDER thay vì file tạm của Werkzeug"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload(current_app.config['UPLOAD_FOLDER'])
@@ -0,0 +1,75 @@
+import re
+
+import pandas as pd
+
+# Tên sheet dữ liệu theo năm: '2023', '2024', ' 2025 '...
+YEAR_SHEET_PATTERN = re.compile(r'^\s*((?:19|20)\d{2})\s*$')
+
+
+class WorkbookLoader:
+    """Đọc workbook nhưng chỉ parse những sheet mà ExcelProcessor thực sự dùng.
+
+    Danh sách sheet được liệt kê trước (chỉ đọc phần mục lục của file), sau đó
+    chỉ sheet Performance và các sheet năm được đọc thành DataFrame. Với file
+    .xlsx, pandas dùng openpyxl ở chế độ read_only nên các dòng được đọc lần
+    lượt, không dựng toàn bộ workbook trong bộ nhớ.
+    """
+
+    def __init__(self, year_sheets=None):
+        # None: tự nhận diện các sheet có tên là năm; hoặc danh sách tên sheet cố định
+        self.year_sheets = list(year_sheets) if year_sheets is not None else None
+
+    @staticmethod
+    def discover_year_sheets(sheet_names):
+        """{năm: tên sheet} của các sheet có tên là năm, theo thứ tự năm tăng dần"""
+        found = {}
+        for sheet_name in sheet_names:
+            match = YEAR_SHEET_PATTERN.match(str(sheet_name))
+            if match and match.group(1) not in found:
+                found[match.group(1)] = sheet_name
+        return dict(sorted(found.items()))
+
+    def cache_token(self):
+        """Chuỗi mô tả cách chọn sheet năm (dùng trong khóa cache)"""
+        if self.year_sheets is None:
+            return 'auto'
+        return ','.join(self.year_sheets)
+
+    @staticmethod
+    def is_performance_sheet(sheet_name):
+        """Sheet Performance hoặc sheet chứa danh sách SKU"""
+        name = str(sheet_name).lower()
+        return 'performance' in name or 'tổng' in name
+
+    def find_performance_sheet(self, sheet_names):
+        """Tên sheet Performance; nếu không tìm thấy thì lấy sheet đầu tiên"""
+        for sheet_name in sheet_names:
+            if self.is_performance_sheet(sheet_name):
+                return sheet_name
+        return sheet_names[0]
+
+    def load(self, source):
+        """Đọc file Excel (đường dẫn hoặc file-like)
+
+        Trả về (performance_sheet, {năm: DataFrame}) - chỉ gồm các sheet năm có trong file.
+        """
+        with pd.ExcelFile(source) as workbook:
+            sheet_names = workbook.sheet_names
+
+            performance_name = self.find_performance_sheet(sheet_names)
+            performance_sheet = workbook.parse(performance_name)
+
+            if self.year_sheets is None:
+                period_sheets = self.discover_year_sheets(sheet_names)
+            else:
+                period_sheets = {year: year for year in self.year_sheets if year in sheet_names}
+
+            year_sheets = {}
+            for year, sheet_name in period_sheets.items():
+                # Sheet năm trùng với sheet Performance thì không đọc lại
+                if sheet_name == performance_name:
+                    year_sheets[year] = performance_sheet
+                else:
+                    year_sheets[year] = workbook.parse(sheet_name)
+
+        return performance_sheet, year_sheets
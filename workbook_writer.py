@@ -0,0 +1,211 @@
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+
+HEADER_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+HEADER_FONT = Font(bold=True, color='FFFFFF', size=11)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+# Header của bảng phụ (vd bảng tổng hợp năm trong sheet TỔNG PERFORMANCE)
+EXTRA_HEADER_FONT = Font(bold=True, color='FFFFFF')
+
+PERCENT_FORMAT = '0.00%'
+CURRENCY_FORMAT = '"$"#,##0.00'
+
+# Định dạng ngày giờ pandas dùng khi ghi DataFrame ra Excel
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+
+MAX_COLUMN_WIDTH = 50
+
+# Độ dài của ô trống (openpyxl trả về None -> 'None')
+_EMPTY_CELL_LENGTH = len(str(None))
+
+
+def column_number_format(header):
+    """Định dạng số của cả cột, dựa trên tên header"""
+    header_value = str(header).lower() if header else ""
+    if 'tacos an toàn' in header_value or 'tacos' in header_value:
+        return PERCENT_FORMAT
+    if any(keyword in header_value for keyword in ['tổng doanh', 'chi phí']):
+        return CURRENCY_FORMAT
+    return None
+
+
+def _display_lengths(series):
+    """Độ dài chuỗi hiển thị của từng giá trị trong cột (giá trị rỗng -> 0)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        text = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        text = series.astype(str)
+    return text.where(series.notna(), '').str.len()
+
+
+def column_layout(df, extra_rows=None, extra_start_row=None):
+    """Tính độ rộng và định dạng số cho từng cột từ thống kê của DataFrame
+
+    Kết quả giống việc đo len(str(cell.value)) trên từng ô sau khi ghi: header,
+    các giá trị của df, bảng phụ extra_rows (nếu có, bắt đầu từ dòng
+    extra_start_row) và các ô trống nằm giữa.
+    Trả về list (độ rộng, định dạng số hoặc None) theo thứ tự cột.
+    """
+    extra_rows = extra_rows or []
+    n_cols = max([len(df.columns)] + [len(row) for row in extra_rows])
+
+    lengths = [0] * n_cols
+    for idx, col in enumerate(df.columns):
+        lengths[idx] = len(str(col))
+        if len(df):
+            lengths[idx] = max(lengths[idx], int(_display_lengths(df.iloc[:, idx]).max()))
+
+    if extra_rows:
+        # Có dòng trống giữa dữ liệu và bảng phụ -> mọi cột đều có ô trống
+        has_gap = extra_start_row > len(df) + 2
+        for idx in range(n_cols):
+            column_values = [row[idx] if idx < len(row) else None for row in extra_rows]
+            if idx >= len(df.columns) or has_gap or None in column_values:
+                lengths[idx] = max(lengths[idx], _EMPTY_CELL_LENGTH)
+            lengths[idx] = max([lengths[idx]] + [len(str(value)) for value in column_values])
+
+    headers = list(df.columns) + [None] * (n_cols - len(df.columns))
+    return [
+        (min(length + 2, MAX_COLUMN_WIDTH), column_number_format(header))
+        for length, header in zip(lengths, headers)
+    ]
+
+
+class StandardWorkbookWriter:
+    """Ghi qua pd.ExcelWriter (openpyxl): cả workbook nằm trong bộ nhớ,
+    formatter(writer, layouts) được gọi để định dạng trước khi lưu file.
+
+    layouts được tính từ DataFrame (column_layout) ngay khi ghi từng sheet.
+    Với append=True, mở workbook có sẵn tại output_path và ghi đè các sheet
+    được ghi lại, các sheet khác (kể cả biểu đồ) giữ nguyên.
+    """
+
+    def __init__(self, output_path, formatter=None, append=False):
+        if append:
+            self._writer = pd.ExcelWriter(output_path, engine='openpyxl', mode='a', if_sheet_exists='replace')
+        else:
+            self._writer = pd.ExcelWriter(output_path, engine='openpyxl')
+        self.formatter = formatter
+        self.layouts = {}
+
+    @property
+    def book(self):
+        return self._writer.book
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and self.formatter is not None:
+                self.formatter(self._writer, self.layouts)
+        finally:
+            self._writer.close()
+
+    def write_sheet(self, sheet_name, df, extra_rows=None, extra_start_row=None):
+        """Ghi một DataFrame (kèm bảng phụ nếu có), trả về tên sheet thực tế"""
+        df.to_excel(self._writer, sheet_name=sheet_name, index=False)
+        self.layouts[sheet_name] = column_layout(df, extra_rows, extra_start_row)
+
+        if extra_rows:
+            ws = self.book[sheet_name]
+            for i, row in enumerate(extra_rows):
+                for j, value in enumerate(row):
+                    cell = ws.cell(row=extra_start_row + i, column=j + 1, value=value)
+                    if i == 0:  # Header
+                        cell.font = EXTRA_HEADER_FONT
+                        cell.fill = HEADER_FILL
+
+        return sheet_name
+
+
+class StreamingWorkbookWriter:
+    """Ghi workbook ở chế độ write_only của openpyxl (bộ nhớ không tăng theo số sheet)
+
+    Độ rộng cột, style header và định dạng số được tính trước từ DataFrame và
+    ghi kèm khi từng dòng được stream ra file, không cần duyệt lại workbook.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.book = openpyxl.Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.book.save(self.output_path)
+
+    def _cell(self, ws, value, number_format=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if number_format:
+            cell.number_format = number_format
+        return cell
+
+    def write_sheet(self, sheet_name, df, extra_rows=None, extra_start_row=None):
+        """Ghi một DataFrame (kèm bảng phụ nếu có), trả về tên sheet thực tế"""
+        ws = self.book.create_sheet(sheet_name)
+        layout = column_layout(df, extra_rows, extra_start_row)
+        formats = [number_format for _, number_format in layout]
+
+        # Độ rộng cột phải được đặt trước khi ghi dòng đầu tiên
+        for idx, (width, _) in enumerate(layout, 1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+
+        if len(df.columns):
+            header = []
+            for col in df.columns:
+                cell = WriteOnlyCell(ws, value=col)
+                cell.fill = HEADER_FILL
+                cell.font = HEADER_FONT
+                cell.alignment = HEADER_ALIGNMENT
+                header.append(cell)
+            ws.append(header)
+
+        # Định dạng của từng cột dữ liệu: theo header, hoặc định dạng ngày giờ
+        value_formats = [
+            formats[idx] or (DATETIME_FORMAT if pd.api.types.is_datetime64_any_dtype(df.iloc[:, idx]) else None)
+            for idx in range(len(df.columns))
+        ]
+        columns = [
+            df.iloc[:, idx].astype(object).where(df.iloc[:, idx].notna(), '').tolist()
+            for idx in range(len(df.columns))
+        ]
+        if any(value_formats):
+            for values in zip(*columns):
+                ws.append([
+                    self._cell(ws, value, number_format) if number_format else value
+                    for value, number_format in zip(values, value_formats)
+                ])
+        else:
+            for values in zip(*columns):
+                ws.append(values)
+
+        if extra_rows:
+            # Dòng trống: chỉ cần ghi ô ở các cột có định dạng số
+            blank_row = [self._cell(ws, None, number_format) if number_format else None for number_format in formats]
+            for _ in range(extra_start_row - len(df) - 2):
+                ws.append(blank_row)
+
+            for i, row in enumerate(extra_rows):
+                cells = []
+                for idx, number_format in enumerate(formats):
+                    if idx >= len(row):
+                        cells.append(self._cell(ws, None, number_format) if number_format else None)
+                        continue
+                    cell = self._cell(ws, row[idx], number_format)
+                    if i == 0:
+                        cell.font = EXTRA_HEADER_FONT
+                        cell.fill = HEADER_FILL
+                    cells.append(cell)
+                ws.append(cells)
+
+        return ws.title